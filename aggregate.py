@@ -0,0 +1,358 @@
+""" Combines the data of all participants into one dataset per section.
+
+Run it with: python aggregate.py [data directory] [--output directory] [--format csv|npz|feather|parquet]
+
+For every section (like "task" and "post-task") it writes two tables: "{section}.events", with the rows of all
+participants' data files, and "{section}.sessions", with one row per session holding its configuration. They can be
+joined on session_id. Each participant's file is read into a typed shard in the output directory, and the tables are
+made by concatenating the shards. An index of the size, modification time and hash of every file is kept next to them,
+so running it again only reads participants whose files are new or changed.
+"""
+
+import argparse
+import csv
+import glob
+import hashlib
+import os
+import pickle
+import re
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+import storage
+
+
+# The version of the index's format. Indexes of other versions are rebuilt
+INDEX_VERSION = 2
+
+# Columns that are always kept as text, even if they look like numbers
+TEXT_COLUMNS = ('session_id', 'participant')
+
+# The directory in the output directory with the shards of every data file, and their endings
+SHARD_DIR = '.shards'
+EVENTS_SHARD = '.events.feather'
+SESSIONS_SHARD = '.sessions.feather'
+
+
+def data_files(data_dir):
+    """ Find all participants' data files under data_dir, by section. Only files with a session file next to them
+    are data files, so wide exports, files that are still being written and other tables (like profiling's timing
+    tables) are skipped.
+
+    @param str data_dir:
+    @rtype: dict[str, list[str]]
+    """
+    files = {}
+    for section_dir in sorted(glob.glob(os.path.join(data_dir, '*', ''))):
+        section = os.path.basename(os.path.dirname(section_dir))
+        paths = [path for path in glob.glob(os.path.join(section_dir, '*.csv'))
+                 if not path.endswith('.wide.csv') and os.path.exists(storage.session_path(path))]
+        if len(paths) != 0:
+            files[section] = sorted(paths)
+    return files
+
+
+def file_signature(path):
+    """ The size and modification time of a data file and its session file
+
+    @param str path:
+    @rtype: list
+    """
+    signature = []
+    for file_path in (path, storage.session_path(path)):
+        if os.path.exists(file_path):
+            stat = os.stat(file_path)
+            signature += [stat.st_size, stat.st_mtime]
+        else:
+            signature += [None, None]
+    return signature
+
+
+def file_hash(path):
+    """ A hash of the contents of a data file and its session file
+
+    @param str path:
+    @rtype: str
+    """
+    digest = hashlib.sha1()
+    for file_path in (path, storage.session_path(path)):
+        if os.path.exists(file_path):
+            with open(file_path, 'rb') as data_file:
+                digest.update(data_file.read())
+    return digest.hexdigest()
+
+
+def shard_path(output_dir, path):
+    """ Where the shards of a data file are kept in the output directory (without their ".events.feather" and
+    ".sessions.feather" endings)
+
+    @param str output_dir:
+    @param str path: The path of the data file
+    @rtype: str
+    """
+    return os.path.join(output_dir, SHARD_DIR, hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest())
+
+
+def read_participant(job):
+    """ Read a participant's data file and session file into shards: one with the file's rows and one with the row of
+    its session (if it has a session file). Only the shards are sent back, so this is cheap for the main process.
+    Runs in a worker process.
+
+    @param (str, str, str|None) job: The path of the data file, where to write its shards and the hash of its contents
+        the last time they were written. Files whose contents didn't change aren't read again
+    @return: The path and the hash of its contents
+    @rtype: (str, str)
+    """
+    path, shard, previous_hash = job
+    digest = file_hash(path)
+    if digest == previous_hash and os.path.exists(shard + EVENTS_SHARD):
+        return path, digest
+
+    write_shard(shard + EVENTS_SHARD, storage.read_columns(path))
+    try:
+        session = storage.read_session(path)
+    except IOError:
+        session = None
+    if session is not None:
+        write_shard(shard + SESSIONS_SHARD, session_row(session, path), parse_text=False)
+    elif os.path.exists(shard + SESSIONS_SHARD):
+        os.remove(shard + SESSIONS_SHARD)
+    return path, digest
+
+
+class Index:
+    """ The size, modification time and hash of each data file the last time it was read"""
+
+    def __init__(self, path):
+        """ Loads the index at path, or starts an empty one
+
+        @param str path:
+        """
+        self.path = path
+        self.files = {}
+        try:
+            with open(path, 'rb') as index_file:
+                index = pickle.load(index_file)
+            if index['version'] == INDEX_VERSION:
+                self.files = index['files']
+        except (IOError, EOFError, KeyError, pickle.UnpicklingError):
+            pass
+
+    def changed(self, paths):
+        """ The paths whose size or modification time changed since they were indexed
+
+        @param list[str] paths:
+        @rtype: list[str]
+        """
+        return [path for path in paths
+                if path not in self.files or self.files[path]['signature'] != file_signature(path)]
+
+    def save(self):
+        """ Save the index to the disk"""
+        temp_path = self.path + storage.PARTIAL_SUFFIX
+        with open(temp_path, 'wb') as index_file:
+            pickle.dump({'version': INDEX_VERSION, 'files': self.files}, index_file, pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, self.path)
+
+
+def typed(values, parse_text=True):
+    """ Convert a column to an array of numbers if all its values are numbers.
+    Integer columns with missing (empty) values become floats, with nan for the missing values.
+
+    Columns read from the data files are all text, so their text is parsed as numbers if it can be. The values
+    from the session files already have their types (like the participant id, which is text even if it's made of
+    digits), so parse_text should be False for them, and only numbers are converted.
+
+    @param list[str|int|float|None] values:
+    @param bool parse_text: Whether to parse text as numbers
+    @rtype: array|list
+    """
+    present = [value for value in values if value is not None and value != '']
+    if not parse_text and not all(isinstance(value, (int, float)) for value in present):
+        return values
+
+    # int() would cut the fractions off floats
+    if len(present) != len(values) or any(isinstance(value, float) for value in present):
+        typecodes = ['d']
+    else:
+        typecodes = ['q', 'd']
+
+    for typecode in typecodes:
+        convert = int if typecode == 'q' else float
+        try:
+            return array(typecode, [float('nan') if value is None or value == '' else convert(value)
+                                    for value in values])
+        except (ValueError, TypeError, OverflowError):
+            pass
+    return values
+
+
+def write_shard(path, columns, parse_text=True):
+    """ Write the columns of a file to a shard: a Feather file with a column of numbers for each column that is made of
+    numbers (see typed), and with missing values left empty (null). Other columns are saved as text.
+
+    @param str path:
+    @param dict[str, list] columns:
+    @param bool parse_text: Whether text that can be parsed as numbers is saved as numbers. Ids are always kept as text
+    @rtype: None
+    """
+    import pyarrow
+    from pyarrow import feather
+
+    arrays = {}
+    for name, values in columns.items():
+        values = typed(values, parse_text and name not in TEXT_COLUMNS)
+        if isinstance(values, list):
+            arrays[name] = pyarrow.array(['' if value is None else str(value) for value in values], pyarrow.string())
+        else:
+            number_type = pyarrow.int64() if values.typecode == 'q' else pyarrow.float64()
+            arrays[name] = pyarrow.array(values.tolist(), number_type, from_pandas=True)
+    feather.write_feather(pyarrow.table(arrays), path, compression='uncompressed')
+
+
+def concatenate(shard_paths):
+    """ Concatenate shards into one table. Columns missing from a shard are left empty (null). Columns that are
+    numbers in some shards and text in others are converted to text.
+
+    @param list[str] shard_paths:
+    @rtype: pyarrow.Table
+    """
+    import pyarrow
+    from pyarrow import feather
+
+    tables = [feather.read_table(path) for path in shard_paths]
+    try:
+        return pyarrow.concat_tables(tables, promote_options='permissive')
+    except pyarrow.ArrowTypeError:
+        # Only the columns that are numbers everywhere stay numbers
+        is_text = {}
+        for table in tables:
+            for field in table.schema:
+                is_text.setdefault(field.name, set()).add(pyarrow.types.is_string(field.type))
+        text_columns = [name for name, kinds in is_text.items() if len(kinds) == 2]
+        tables = [table.cast(pyarrow.schema([pyarrow.field(field.name, pyarrow.string())
+                                             if field.name in text_columns else field for field in table.schema]))
+                  for table in tables]
+        return pyarrow.concat_tables(tables, promote_options='permissive')
+
+
+def recovered(path):
+    """ Whether the data file at path was recovered from a session that crashed (see storage.recover), so it only has
+    the trials done before the crash
+
+    @param str path:
+    @rtype: bool
+    """
+    return re.search(r'\.recovered\d+\.csv$', path) is not None
+
+
+def session_row(session, path):
+    """ A row of the sessions table for a session: its id, section and start time, whether it was recovered from a
+    crash, its configuration and environment, its performance mode, its warm up and its timing summary (without
+    lists, like the histogram)
+
+    @param dict session:
+    @param str path: The path of the session's data file
+    @rtype: dict[str, list]
+    """
+    row = {key: [session.get(key)] for key in ('session_id', 'experiment', 'section', 'started')}
+    row['recovered'] = [int(recovered(path))]
+    row.update({key: [value] for key, value in session.get('config', {}).items()})
+    row.update({'environment_' + key: [value] for key, value in session.get('environment', {}).items()})
+    row.update({'realtime_' + key: [value] for key, value in session.get('realtime', {}).items()})
+    row.update({'warm_up_' + key: [value] for key, value in (session.get('warm_up') or {}).items()
+                if not isinstance(value, list)})
+    row.update({'timing_' + key: [value] for key, value in session.get('timing', {}).items()
+                if not isinstance(value, list)})
+    return row
+
+
+def write_table(path, table, output_format):
+    """ Write a table to path (without its extension) in the given format
+
+    @param str path:
+    @param pyarrow.Table table:
+    @param str output_format: csv, or one of storage.BACKENDS
+    @rtype: None
+    """
+    import pyarrow
+
+    if output_format == 'csv':
+        with open(path + '.csv', 'w', newline='') as output_file:
+            writer = csv.writer(output_file, lineterminator='\n')
+            writer.writerow(table.column_names)
+            writer.writerows(zip(*[column.to_pylist() for column in table.columns]))
+        return
+
+    extension, save = storage.BACKENDS[output_format]
+    save(path + extension, {name: column.fill_null('').to_pylist() if pyarrow.types.is_string(column.type)
+                            else column.to_numpy() for name, column in zip(table.column_names, table.columns)})
+
+
+def aggregate(data_dir, output_dir, output_format='csv', workers=None):
+    """ Combine the data of all participants under data_dir into one events and one sessions table per section,
+    only reading the files that are new or changed since the last time.
+
+    @param str data_dir: The directory the experiment saved its data to
+    @param str output_dir: Where to write the tables and keep the index and the shards
+    @param str output_format: csv, or one of storage.BACKENDS
+    @param int|None workers: How many processes read files at once. Defaults to the number of CPUs
+    @return: How many files were read, and how many there are in total
+    @rtype: (int, int)
+    """
+    # The shards are always Feather files
+    storage.check_formats(['feather', output_format])
+    if not os.path.exists(os.path.join(output_dir, SHARD_DIR)):
+        os.makedirs(os.path.join(output_dir, SHARD_DIR))
+
+    index = Index(os.path.join(output_dir, '.aggregate_index.pickle'))
+    files = data_files(data_dir)
+    all_paths = [path for paths in files.values() for path in paths]
+    shards = {path: shard_path(output_dir, path) for path in all_paths}
+
+    # Files whose size or modification time changed are hashed again, but only read if their contents changed
+    stale = set(index.changed(all_paths))
+    changed = [path for path in all_paths if path in stale or not os.path.exists(shards[path] + EVENTS_SHARD)]
+    jobs = [(path, shards[path], index.files.get(path, {}).get('hash')) for path in changed]
+    if len(jobs) != 0:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for path, digest in executor.map(read_participant, jobs, chunksize=64):
+                index.files[path] = {'hash': digest, 'signature': file_signature(path)}
+
+    # Forget files that were deleted, along with their shards
+    index.files = {path: index.files[path] for path in all_paths}
+    index.save()
+    kept = set(os.path.basename(shard) for shard in shards.values())
+    for name in os.listdir(os.path.join(output_dir, SHARD_DIR)):
+        if name.split('.')[0] not in kept:
+            os.remove(os.path.join(output_dir, SHARD_DIR, name))
+
+    for section, paths in files.items():
+        events = concatenate([shards[path] + EVENTS_SHARD for path in paths])
+        sessions = concatenate([shards[path] + SESSIONS_SHARD for path in paths
+                                if os.path.exists(shards[path] + SESSIONS_SHARD)])
+
+        write_table(os.path.join(output_dir, section + '.events'), events, output_format)
+        write_table(os.path.join(output_dir, section + '.sessions'), sessions, output_format)
+
+    return len(changed), len(all_paths)
+
+
+def main():
+    """ Aggregate the data from the command line"""
+    parser = argparse.ArgumentParser(description="Combine the data of all participants into one dataset per section.")
+    parser.add_argument('data_dir', nargs='?', default='data', help="The directory with the data (default: data)")
+    parser.add_argument('--output', default='aggregate', help="Where to write the dataset (default: aggregate)")
+    parser.add_argument('--format', default='csv', choices=['csv'] + list(storage.BACKENDS),
+                        help="The format of the dataset (default: csv)")
+    parser.add_argument('--workers', type=int, default=None, help="How many processes read files at once")
+    args = parser.parse_args()
+
+    start = time.time()
+    read, total = aggregate(args.data_dir, args.output, args.format, args.workers)
+    print("Read {0} of {1} files in {2:.2f}s".format(read, total, time.time() - start))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+""" An index of the images used by the experiment.
+
+Images are stored as images/{section}/{genre}/{subgenre}/{slide}.png, or as images/{section}/{genre}/{slide}.png
+when they have no subgenre. The manifest of all images is built once, cached on the disk and reused
+by later sessions as long as none of the images changed.
+"""
+
+import json
+import os
+import re
+import struct
+
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+def image_dimensions(path):
+    """ Get the width and height of the image at path, by reading its header.
+    Only PNGs are supported, None is returned for other images.
+
+    @param str path:
+    @rtype: list[int]|None
+    """
+    if not path.lower().endswith('.png'):
+        return None
+
+    with open(path, 'rb') as image:
+        header = image.read(24)
+
+    # The signature is followed by the IHDR chunk, which starts with the width and the height
+    if header[:8] != PNG_SIGNATURE or header[12:16] != b'IHDR':
+        raise ValueError("'{}' is not a valid PNG image".format(path))
+
+    return list(struct.unpack('>II', header[16:24]))
+
+
+def slide_order(path):
+    """ A sort key that puts slides in their natural order (so '2.png' comes before '10.png')
+
+    @param str path:
+    @rtype: list
+    """
+    return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', os.path.basename(path))]
+
+
+class AssetManifest:
+    """ A manifest of all the images under a directory, with their size and dimensions.
+    Sequences of slides are looked up in constant time.
+    """
+
+    def __init__(self, root='images', cache_path=None):
+        """ Loads the manifest of all images under root from cache_path, or builds it if
+        the cache is missing or out of date.
+
+        @param str root: The directory the images are in
+        @param str|None cache_path: Where to cache the manifest. Defaults to {root}/.manifest.json
+        """
+        self.root = root
+        self.cache_path = cache_path if cache_path is not None else os.path.join(root, '.manifest.json')
+
+        files = self._scan()
+        self.entries = self._load_cache(files)
+        if self.entries is None:
+            self.entries = self._build(files)
+            self._save_cache()
+
+        # Index the slides by (section, genre, subgenre, extension), in the order they are shown
+        self._sequences = {}
+        for path in sorted(self.entries, key=slide_order):
+            entry = self.entries[path]
+            key = (entry['section'], entry['genre'], entry['subgenre'], os.path.splitext(path)[1])
+            self._sequences.setdefault(key, []).append(path)
+
+        self._sequences = {key: tuple(paths) for key, paths in self._sequences.items()}
+
+    def _scan(self):
+        """ Find all images under root, with their size and modification time
+
+        @rtype: dict[str, (int, float)]
+        """
+        files = {}
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                if name.startswith('.'):
+                    continue
+                path = os.path.join(directory, name)
+                stat = os.stat(path)
+                files[path] = (stat.st_size, stat.st_mtime)
+        return files
+
+    def _load_cache(self, files):
+        """ Load the cached manifest, if it describes exactly the given files
+
+        @param dict[str, (int, float)] files: The files currently under root
+        @rtype: dict[str, dict]|None
+        """
+        try:
+            with open(self.cache_path) as cache:
+                entries = json.load(cache)
+        except (IOError, ValueError):
+            return None
+
+        if set(entries) != set(files):
+            return None
+
+        for path in files:
+            if (entries[path]['size'], entries[path]['mtime']) != files[path]:
+                return None
+
+        return entries
+
+    def _build(self, files):
+        """ Build the manifest entries for the given files
+
+        @param dict[str, (int, float)] files: The files currently under root
+        @rtype: dict[str, dict]
+        """
+        entries = {}
+        for path, (size, mtime) in files.items():
+            parts = os.path.relpath(path, self.root).split(os.sep)
+            if len(parts) == 3:
+                section, genre, _ = parts
+                subgenre = ''
+            elif len(parts) == 4:
+                section, genre, subgenre, _ = parts
+            else:
+                raise ValueError("'{}' is not in a images/section/genre/[subgenre/] directory".format(path))
+
+            entries[path] = {'section': section, 'genre': genre, 'subgenre': subgenre,
+                             'size': size, 'mtime': mtime, 'dimensions': image_dimensions(path)}
+        return entries
+
+    def _save_cache(self):
+        """ Save the manifest to cache_path, so later sessions don't have to build it again"""
+        try:
+            with open(self.cache_path, 'w') as cache:
+                json.dump(self.entries, cache, indent=1, sort_keys=True)
+        except IOError:
+            # The images might be on a read-only drive. We'll just build the manifest again next time
+            pass
+
+    def paths(self):
+        """ All the image paths in the manifest
+
+        @rtype: list[str]
+        """
+        return list(self.entries)
+
+    def sequence(self, section, genre, subgenre='', extension='.png'):
+        """ The paths of the slides in images/{section}/{genre}/{subgenre}/, in the order they are shown
+
+        @rtype: tuple[str]
+        """
+        return self._sequences.get((section, genre, subgenre, extension), ())
+
+    def image(self, section, genre, name, subgenre='', extension='.png'):
+        """ The path of the image images/{section}/{genre}/{subgenre}/{name}{extension}
+
+        @rtype: str
+        """
+        path = os.path.join(self.root, section, genre, subgenre, name + extension)
+        path = os.path.normpath(path)
+        if path not in self.entries:
+            raise FileNotFoundError("Image '{}' is missing".format(path))
+        return path
+
+    def require(self, sequences):
+        """ Makes sure that all the given sequences of slides have at least one slide,
+        so missing images are found before the session starts
+
+        @param list[(str, str, str)] sequences: The (section, genre, subgenre) of each sequence
+        @rtype: None
+        """
+        missing = [os.path.join(self.root, *sequence) for sequence in sequences if not self.sequence(*sequence)]
+        if len(missing) != 0:
+            raise FileNotFoundError("No images found in: {}".format(", ".join(missing)))
+
+
+class ImageSequence:
+    """ Adds show_image_sequence to a window, built on the window's own show_image and wait_for_prompt (so a window
+    that logs them, like events.RecordingWindow, logs every slide). The window needs experiment and assets attributes.
+    """
+
+    def show_image_sequence(self, genre, subgenre='', task=None, extension='.png'):
+        """ Shows all the images which follow the pattern
+        'image/{task}/{genre}/{subgenre}/*{extension}', in ascending order, each until a key is pressed.
+
+        @param str genre:
+        @param str subgenre:
+        @param str|None task: Defaults to the current section
+        @param str extension:
+        @rtype: None
+        """
+        if task is None:
+            task = self.experiment.section
+
+        with self.experiment.profiler.span('show_image_sequence'):
+            for image_path in self.assets.sequence(task, genre, subgenre, extension):
+                self.show_image(image_path)
+                self.wait_for_prompt()
@@ -0,0 +1,116 @@
+""" Measures how long the experiment takes to start, from a cold python process to the first instructions.
+
+Starts the experiment several times, each in a new process, without the dialog (as participant 1), and
+reports the median time of each phase of the start (see startup.py). The results are added to a history file, so
+the start time can be compared across versions. Run it like:
+
+    python bench_startup.py --runs 5
+
+Sessions are headless by default, so it runs anywhere. Use --display to open the real window.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def child(display, output_location):
+    """ Start the experiment once in this process, and print the startup report as json
+
+    @param bool display: Whether to open the real window instead of a headless one
+    @param str output_location: Where the experiment saves its files
+    """
+    import startup
+    import project
+
+    window_factory = None
+    if not display:
+        import headless
+        window_factory = headless.HeadlessWindow
+
+    experiment = project.start('1', '', window_factory, output_location=output_location)
+    report = startup.report()
+    experiment.close()
+    print(json.dumps(report))
+
+
+def run(display):
+    """ Start the experiment once in a new process
+
+    @param bool display:
+    @return: The startup report, and the time the whole process took
+    @rtype: dict[str, float]
+    """
+    with tempfile.TemporaryDirectory() as output_location:
+        command = [sys.executable, os.path.abspath(__file__), '--child', '--output', output_location]
+        if display:
+            command.append('--display')
+
+        start = time.perf_counter()
+        output = subprocess.run(command, check=True, stdout=subprocess.PIPE, universal_newlines=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+        report = json.loads(output.strip().splitlines()[-1])
+        report['process'] = time.perf_counter() - start
+    return report
+
+
+def version():
+    """ The version of the experiment being measured, from git if possible
+
+    @rtype: str
+    """
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], check=True, stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL, universal_newlines=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def main():
+    """ Measure the start from the command line"""
+    parser = argparse.ArgumentParser(description="Measure how long the experiment takes to start.")
+    parser.add_argument('--runs', type=int, default=5, help="How many times to start it (default: 5)")
+    parser.add_argument('--display', action='store_true', help="Open the real window instead of a headless one")
+    parser.add_argument('--history', default='bench_startup.jsonl',
+                        help="The file to add the results to (default: bench_startup.jsonl)")
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--output', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.display, args.output)
+        return
+
+    reports = [run(args.display) for _ in range(args.runs)]
+    medians = {phase: statistics.median(report[phase] for report in reports) for phase in reports[0]}
+
+    previous = None
+    if os.path.exists(args.history):
+        with open(args.history) as history:
+            lines = [line for line in history if line.strip() != '']
+        if len(lines) > 0:
+            previous = json.loads(lines[-1])
+
+    print("Median of {0} starts:".format(args.runs))
+    for phase, median in medians.items():
+        change = ''
+        if previous is not None and phase in previous['medians']:
+            change = " ({0:+.0f} ms since {1})".format((median - previous['medians'][phase]) * 1000,
+                                                       previous['version'])
+        print("{0:>10}: {1:7.0f} ms{2}".format(phase, median * 1000, change))
+
+    with open(args.history, 'a') as history:
+        history.write(json.dumps({'version': version(), 'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+                                  'python': platform.python_version(), 'display': args.display,
+                                  'runs': args.runs, 'medians': medians}) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,19 +1,46 @@
 import time
+import zlib
 
 
 class Configuration:
     """ The configuration for an experiment """
-    def __init__(self, participant, age_group):
-        """ Creates a configuration with the following values"""
+    def __init__(self, participant, age_group, seed=None):
+        """ Creates a configuration with the following values. The seed defaults to one made from the participant"""
         self.output_location = "data"
         self.practice_run = True
 
         self.task_no_keyboard_response_time = 0.150
         self.task_interstimulus_interval = 0
         self.task_feed_back_display_time = 0.150
-		
-		self.task_key1 = 'j';
-		self.task_key2 = 'f';
+
+        self.task_key1 = 'j'
+        self.task_key2 = 'f'
+
+        # Turn off garbage collection and raise the priority of the experiment while blocks run (see realtime.py)
+        self.realtime_mode = False
+        # The CPU core to run the experiment on (Linux only), or None to let the OS choose
+        self.realtime_cpu = None
+
+        # Time the phases of every trial and save a table of them in "profile" in the output location (see profiling.py)
+        self.profiling = False
+        # Also capture the whole session with 'cprofile' or 'pyinstrument' (which has to be installed), or None
+        self.profiling_capture = None
+
+        # A section's timing summary is flagged if more than this fraction of its frames were dropped
+        self.max_dropped_frame_fraction = 0.01
+
+        # Formats to save the data in, along with csv (which is always saved): 'npz', 'feather' and/or 'parquet'
+        self.output_formats = ['csv']
+
+        # Save every keystroke typed on open ended questions, and when it was typed
+        self.record_keystrokes = True
+
+        # Send the progress of the session to a collector, to watch many stations at once (see telemetry.py)
+        self.telemetry = False
+        # Where to send it: the computer running the collector (or '255.255.255.255' for every computer on the
+        # network), and the port it listens on
+        self.telemetry_host = '127.0.0.1'
+        self.telemetry_port = 47800
 
         # ===================== Below variables are generated! ==========================
         # Save the age group and participant
@@ -24,6 +51,9 @@ class Configuration:
         self.participant_num = int("".join([c for c in self.participant if c.isdigit()]))
 
         self.date = time.strftime('%c')
+
+        # Everything random in the session comes from this seed, so the session can be run again the same way
+        self.seed = seed if seed is not None else zlib.crc32(self.participant.encode('utf-8'))
         self.condition = self.participant_num % 4  # can be 0, 1, 2, or 3
 
         # True in half of the trials, in which letter will occur more often with the '@'
@@ -33,5 +63,5 @@ class Configuration:
         self.letter_pair_condition = self.condition // 2 == 0
 
         # More useful version of above variable to use in code
-        self.letter_key = task_key1 if self.letter_pair_condition else task_key2
-        self.number_key = task_key2 if self.letter_pair_condition else task_key1
+        self.letter_key = self.task_key1 if self.letter_pair_condition else self.task_key2
+        self.number_key = self.task_key2 if self.letter_pair_condition else self.task_key1
@@ -0,0 +1,25 @@
+""" The dialog asking for the participant, which only needs psychopy's gui and not the rest of psychopy"""
+
+import sys
+
+from psychopy import gui
+
+
+def ask_user_info(title):
+    """ A method used to ask the user for their participant id and their age group.
+        Will quit if the user presses 'cancel'
+
+        @param str title: The title of the pop-up box
+        @return (str, str): A tuple with of (participant id, age group)
+    """
+    info = {'Participant': '', 'Age group': ''}
+
+    # Store info about the experiment session
+    dialogue = gui.DlgFromDict(dictionary=info, title=title)
+
+    # User pressed cancel, so quit!
+    if dialogue.OK is False:
+        sys.exit()
+
+    # Return the results
+    return info['Participant'], info['Age group']
@@ -0,0 +1,254 @@
+""" Recording every stimulus shown and every input received during a session, and replaying them.
+
+The log is a json lines file, with one event per line. The first event describes the session (participant, age group
+and seed), so the same session can be run again: with the same seed it shows the same stimuli, and a ReplayResponder
+gives the same answers after the same delays.
+"""
+
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+
+import assets
+
+
+# Tells the writing thread to stop
+_CLOSE = object()
+
+
+class EventLog:
+    """ A log of events, written to a json lines file as they happen. Like storage.StreamingWriter, the events are
+    encoded and written on a background thread, so logging them doesn't hold up the trials, and an error of the
+    thread is raised by the next write and by close.
+
+    The log is also closed when the program exits, so the events still waiting to be written aren't lost when the
+    session is ended early (like with escape).
+    """
+
+    def __init__(self, path, session):
+        """ Creates the log at path, starting with an event describing the session
+
+        @param str path:
+        @param dict session: The participant, age group and seed of the session
+        """
+        directory = os.path.dirname(path)
+        if directory != '' and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self.path = path
+        self._file = open(path, 'w')
+
+        # The error that stopped the background thread, if any
+        self._error = None
+
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._write, name="event log", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+        self.write(dict(session, event='session'))
+
+    def write(self, event):
+        """ Write an event to the log. Returns immediately, the event is written on the background thread.
+        The event shouldn't be changed after it's written.
+
+        @param dict event:
+        @rtype: None
+        """
+        if self._error is not None:
+            raise self._error
+        self._queue.put(event)
+
+    def _write(self):
+        """ Writes events as they come in, until closed or an error stops it"""
+        try:
+            self._write_events()
+        except Exception as error:
+            self._error = error
+
+    def _write_events(self):
+        """ Writes events as they come in, until closed"""
+        while True:
+            event = self._queue.get()
+            if event is _CLOSE:
+                return
+
+            self._file.write(json.dumps(event) + '\n')
+            # Hand the events to the OS once there are no more waiting, so they survive the program crashing
+            if self._queue.empty():
+                self._file.flush()
+
+    def close(self):
+        """ Write the remaining events and close the log. Raises the error of the background thread, if it had one"""
+        if self._file.closed:
+            return
+
+        atexit.unregister(self.close)
+        self._queue.put(_CLOSE)
+        self._thread.join()
+        self._file.close()
+        if self._error is not None:
+            raise self._error
+
+
+def read(path):
+    """ Read all the events in the log at path
+
+    @param str path:
+    @rtype: list[dict]
+    """
+    with open(path) as log:
+        return [json.loads(line) for line in log if line.strip() != '']
+
+
+class RecordingWindow(assets.ImageSequence):
+    """ Wraps a window (visual.Window or headless.HeadlessWindow), logging every stimulus it shows and every input
+    it gets. All other methods and attributes are those of the wrapped window.
+    """
+
+    def __init__(self, window, log):
+        """ Wraps window, writing events to log
+
+        @param visual.Window|headless.HeadlessWindow window:
+        @param EventLog log:
+        """
+        self.window = window
+        self.log = log
+
+    def __getattr__(self, name):
+        return getattr(self.window, name)
+
+    def _write(self, event, **values):
+        """ Log an event in the current section"""
+        values.update(event=event, section=self.window.experiment.section)
+        self.log.write(values)
+
+    def show_image(self, path):
+        """ Show the image at the given path, and log it"""
+        timing = self.window.show_image(path)
+        self._write('image', path=path, onset=timing.onset)
+        return timing
+
+    def show_text(self, text, font_size=24, legend=None, legend_font_size=24):
+        """ Show the text, and log it"""
+        timing = self.window.show_text(text, font_size, legend, legend_font_size)
+        self._write('text', text=text, onset=timing.onset)
+        return timing
+
+    def wait_for_prompt(self, timer=None, keys='space', timestamped=False):
+        """ Wait for one of the keys to be pressed, and log it"""
+        start = self.window.get_time()
+        key_press = self.window.wait_for_prompt(timer, keys, timestamped=True)
+        if key_press is None:
+            self._write('key', key=None, delay=self.window.get_time() - start)
+            return None
+
+        self._write('key', key=key_press.name, time=key_press.time, delay=key_press.time - start)
+        return key_press if timestamped else key_press.name
+
+    def wait_for_choice(self, prompt, choices, prompt_font_size=24, instruction_font_size=20, choice_font_size=20,
+                        timestamped=False):
+        """ Wait for one of the choices to be picked, and log it"""
+        start = self.window.get_time()
+        choice = self.window.wait_for_choice(prompt, choices, prompt_font_size, instruction_font_size,
+                                             choice_font_size, timestamped=True)
+        self._write('choice', prompt=prompt, choice=choice.name, latency=choice.latency,
+                    delay=self.window.get_time() - start)
+        return choice if timestamped else choice.name
+
+    def get_input_text(self, prompt=None, prompt_font_size=24, input_font_size=20, timestamped=False):
+        """ Get text typed in by the user, and log it with when each keystroke was typed"""
+        start = self.window.get_time()
+        typed = self.window.get_input_text(prompt, prompt_font_size, input_font_size, timestamped=True)
+        self._write('input_text', prompt=prompt, text=typed.text, keystrokes=typed.keystroke_names,
+                    keystroke_times=typed.keystroke_times, delay=self.window.get_time() - start)
+        return typed if timestamped else typed.text
+
+    def close(self):
+        """ Close the window and the log"""
+        self.window.close()
+        self.log.close()
+
+
+class ReplayError(Exception):
+    """ Raised when a replayed session doesn't ask for the same inputs as the recorded one"""
+
+
+class ReplayResponder:
+    """ Answers like the participant of a recorded session did, after the same delays.
+    Can be used as the responder of a headless.HeadlessWindow or of a visual.Window.
+    """
+
+    def __init__(self, path, realtime=False):
+        """ Loads the recorded session at path
+
+        @param str path: The path of an event log
+        @param bool realtime: Whether a visual.Window should wait for the recorded delays, or answer right away
+        """
+        recorded = read(path)
+        self.session = recorded[0]
+        self.realtime = realtime
+        self._inputs = iter([event for event in recorded if event['event'] in ('key', 'choice', 'input_text')])
+
+    def _next(self, event_type):
+        """ The next recorded input, which has to be of the given type
+
+        @param str event_type:
+        @rtype: dict
+        """
+        event = next(self._inputs, None)
+        if event is None or event['event'] != event_type:
+            raise ReplayError("Expected {0} but the recording has {1}".format(event_type, event))
+        return event
+
+    def press_key(self, stimulus, keys, config):
+        """ The key the participant pressed, and how long they took to press it
+
+        @rtype: (str|None, float)
+        """
+        event = self._next('key')
+        if event['key'] is not None and event['key'] not in keys:
+            raise ReplayError("Recorded key {0} is not one of {1}".format(event['key'], keys))
+        return event['key'], event['delay']
+
+    def choose(self, prompt, choices):
+        """ The choice the participant made, and how long they took to make it
+
+        @rtype: (str, float)
+        """
+        event = self._next('choice')
+        if event['choice'] not in choices:
+            raise ReplayError("Recorded choice {0} is not one of {1}".format(event['choice'], choices))
+        return event['choice'], event['delay']
+
+    def type_text(self, prompt):
+        """ The text the participant typed, and how long they took to type it
+
+        @rtype: (str, float)
+        """
+        event = self._next('input_text')
+        return event['text'], event['delay']
+
+
+def log_path(output_location, participant, session_id):
+    """ Where the event log of a session is saved
+
+    @param str output_location:
+    @param str participant:
+    @param str session_id:
+    @rtype: str
+    """
+    return os.path.join(output_location, 'events', "{0}.{1}.jsonl".format(participant, session_id))
+
+
+def session_info(config):
+    """ The information about a session needed to run it again
+
+    @param config.Configuration config:
+    @rtype: dict
+    """
+    return {'participant': config.participant, 'age_group': config.age_group, 'seed': config.seed,
+            'started': time.strftime('%c')}
@@ -1,69 +1,186 @@
 import os
-import visual
+import random
+import time
+import uuid
 import config
-from pandas import DataFrame
+import events
+import profiling
+import realtime
+import records
+import startup
+import storage
+import telemetry
 
 
 class Experiment:
     """ A general experiment class containing all the information for the experiment.
     """
 
-    def __init__(self):
-        """ Initializes a experiment class. """
+    def __init__(self, participant=None, age_group=None, window_factory=None, seed=None, output_location=None):
+        """ Initializes a experiment class.
+
+        @param str|None participant: The participant id, or None to ask for it (and the age group) in a dialog
+        @param str|None age_group: The participant's age group
+        @param window_factory: Makes the window from the experiment, like headless.HeadlessWindow.
+            Defaults to visual.Window
+        @param int|None seed: The seed of the session. Defaults to one made from the participant id
+        @param str|None output_location: Where to save the data, instead of config.output_location
+        """
         self.name = "Smiley"
         self.section = 'setup'
-        self._data = []
-        self._data_type = None
+        self.session_id = uuid.uuid4().hex
+        self._writer = None
+        self._schema = None
+        self._data = None
 
-        self.participant, self.age_group = visual.ask_user_info(self.name)
-        self.config = config.Configuration(self.participant, self.age_group)
+        # Where the frame intervals of this section start
+        self._frames = (0, 0)
 
-        self.window = visual.Window(self)
+        # What warm_up found, if it was run
+        self.warm_up_report = None
 
-    def push_data(self, data_point):
-        """ Adds a data point to be saved later.
+        if participant is None:
+            # Only load psychopy when we need it, so headless sessions can run without it
+            import dialog
 
-            @param lst data_point: The data point to be saved
-            @rtype None
-        """
-        if self._data_type is None and data_point is not None:
-            self._data_type = type(data_point)
-        elif type(data_point) != self._data_type or data_point is None:
-            raise ValueError("data_point ", data_point, "has the wrong type")
+            participant, age_group = dialog.ask_user_info(self.name)
+            startup.mark('dialog')
+        self.participant, self.age_group = participant, age_group
+        self.config = config.Configuration(self.participant, self.age_group, seed)
+        if output_location is not None:
+            self.config.output_location = output_location
+        storage.check_formats(self.config.output_formats)
 
-        to_save = dict(vars(data_point))
-        while '_DataPoint__parent' in to_save:
-            parent = to_save.pop('_DataPoint__parent')
-            to_save.update(vars(parent))
+        # Keeps the garbage collector and the OS out of the way of the blocks, if the config asks for it
+        self.realtime = realtime.RealtimeMode(self.config.realtime_mode, self.config.realtime_cpu)
 
-        for key in to_save:
-            if type(to_save[key]) is bool:
-                to_save[key] = int(to_save[key])
+        # Times the phases of the session, if the config asks for it
+        self.profiler = profiling.Profiler(self.config.profiling, self.config.profiling_capture)
 
-        self._data.append(to_save)
+        # Sends the progress of the session to a collector, if the config asks for it
+        self.telemetry = telemetry.Publisher(self.config.telemetry,
+                                             (self.config.telemetry_host, self.config.telemetry_port),
+                                             participant=self.participant, session_id=self.session_id)
 
-    def new_section(self, section_name):
-        """ Start a new section of the experiment"""
-        self.section = section_name
-        self._data = []
-        self._data_type = None
+        # Anything random in the session should use this, so the session can be run again the same way
+        self.rng = random.Random(self.config.seed)
 
-    def save_data(self):
-        """ Saves the data data that was pushed since the last time new section was called to:
-        "{section}.csv" and resets the data to be saved
+        if window_factory is None:
+            # Probably already loaded in the background while the dialog was open
+            import visual
 
-        """
+            window_factory = visual.Window
+
+        # Record every stimulus and input, so the session can be replayed
+        log = events.EventLog(events.log_path(self.config.output_location, self.participant, self.session_id),
+                              events.session_info(self.config))
+        self.window = events.RecordingWindow(window_factory(self), log)
+        startup.mark('window')
+
+    def push_data(self, data_point):
+        """ Adds a data point to be saved. It is written to the disk right away, in the background.
 
+            @param records.Record data_point: The data point to be saved
+            @rtype None
+        """
+        with self.profiler.span('push_data'):
+            if self._schema is None and data_point is not None:
+                # The columns to save are only worked out once per section
+                self._schema = records.Schema(data_point)
+                self._data = records.ColumnBuffer(self._schema)
+                self._writer = self._open_writer(self._schema.columns)
+            elif data_point is None or not self._schema.matches(data_point):
+                raise ValueError("data_point ", data_point, "has the wrong type")
+
+            values = self._schema.values(data_point)
+            self._data.append(values)
+            self._writer.write(values)
+
+    def _open_writer(self, columns):
+        """ Opens a writer for this section's data, with the given columns. Also writes the section's
+        session record, so the configuration is saved once instead of in every row.
+
+        @param list[str] columns:
+        @rtype: storage.StreamingWriter
+        """
         dir_loc = "{0}/{1}/".format(self.config.output_location, self.section)
         # Make sure the file directory exists
         if not os.path.exists(dir_loc):
             os.makedirs(dir_loc)
 
-        # Get the output file
+        # Get the output file, keeping the data of any earlier session that crashed before saving
         file_loc = dir_loc + self.participant + ".csv"
-        df = DataFrame(self._data)
-        df.to_csv(file_loc, index=False)
+        storage.recover(file_loc)
+
+        # Every row refers to the session record by its id
+        writer = storage.StreamingWriter(file_loc, columns, {'session_id': self.session_id})
+
+        # The session record stays next to the unfinished file until it's finalized, so the session record of an
+        # earlier complete file is kept if this session doesn't finish
+        storage.write_session(writer.partial_path, {'session_id': self.session_id,
+                                                    'experiment': self.name,
+                                                    'section': self.section,
+                                                    'started': time.strftime('%c'),
+                                                    'config': records.constants(self.config),
+                                                    'environment': storage.environment(),
+                                                    'realtime': self.realtime.status(),
+                                                    'warm_up': self.warm_up_report,
+                                                    'startup': startup.report()})
+        return writer
+
+    def warm_up(self):
+        """ Warm up the window before the first section, so the first trials are not slower than the others.
+        Prepare the stimuli (like task.prepare) first, so they are warmed up too. The report is saved with the data.
+
+        @return: The window's warm up report
+        @rtype: dict
+        """
+        self.warm_up_report = self.window.warm_up()
+        startup.mark('warm_up')
+        return self.warm_up_report
+
+    def new_section(self, section_name):
+        """ Start a new section of the experiment"""
+        self.section = section_name
+        self.telemetry.section(section_name)
+        self._frames = self.window.frame_intervals.mark()
+        self._writer = None
+        self._schema = None
+        self._data = None
+
+    def save_data(self):
+        """ Finishes saving the data that was pushed since the last time new section was called to:
+        "{section}/{participant}.csv". All of it was already written while it was pushed,
+        so this only moves the file to its final place.
+
+        The data is also saved in the other formats in config.output_formats, like "{section}/{participant}.npz".
+        """
+        with self.profiler.span('save_data'):
+            if self._writer is None:
+                self._writer = self._open_writer([])
+
+            # Add how well the frames were timed during the section, and the final state of the performance mode,
+            # to its session file, before it's moved into place along with the data
+            path = self._writer.path if self._writer.finalized else self._writer.partial_path
+            session = storage.read_session(path)
+            session['realtime'] = self.realtime.status()
+            session['timing'] = self.window.frame_intervals.summary(self._frames,
+                                                                     self.config.max_dropped_frame_fraction)
+            storage.write_session(path, session)
+            self._writer.finalize()
+
+            if self._data is not None:
+                columns = {'session_id': [self.session_id] * self._data.length}
+                columns.update(self._data.columns())
+                storage.save_columns(self._writer.path, columns, self.config.output_formats)
+
+        self.telemetry.saved()
+
+        # The timing table has everything up to the end of this section
+        self.profiler.save(profiling.profile_path(self.config.output_location, self.participant, self.session_id))
 
     def close(self):
         """ Ends the experiment. Does not save any data"""
-        self.window.close()
\ No newline at end of file
+        self.window.close()
+        self.profiler.close()
+        self.telemetry.close()
\ No newline at end of file
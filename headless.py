@@ -0,0 +1,287 @@
+""" A window that runs the experiment without a display, driven by a simulated participant.
+
+It has the same methods as visual.Window, but nothing is drawn and no input is read. Instead, a responder decides
+what the participant answers and how long they take, and all waiting happens in virtual time, so a whole session
+runs in a fraction of a second. It doesn't need psychopy.
+"""
+
+import math
+import random
+
+import assets
+from timing import Choice, FrameIntervals, KeyPress, StimulusTiming, TypedText
+
+
+def ex_gaussian(mu=0.45, sigma=0.08, tau=0.15, minimum=0.1):
+    """ A response time distribution: a normal distribution (mu, sigma) plus an exponential tail (tau).
+    All in s. Response times below minimum are raised to it.
+
+    @rtype: (random.Random) -> float
+    """
+    def sample(rng):
+        return max(minimum, rng.gauss(mu, sigma) + rng.expovariate(1.0 / tau))
+    return sample
+
+
+def fixed(seconds):
+    """ A response time distribution that always takes the given amount of seconds
+
+    @param float seconds:
+    @rtype: (random.Random) -> float
+    """
+    return lambda rng: seconds
+
+
+class VirtualClock:
+    """ A clock that only moves forward when told to"""
+
+    def __init__(self):
+        """ Starts the clock at 0"""
+        self.time = 0.0
+
+    def getTime(self):
+        """ The current virtual time, in s
+
+        @rtype: float
+        """
+        return self.time
+
+    def advance(self, seconds):
+        """ Move the clock forward by the given amount of seconds
+
+        @param float seconds:
+        @rtype: None
+        """
+        self.time += max(0.0, seconds)
+
+
+class SimulatedResponder:
+    """ A simulated participant. Answers correctly with the given accuracy, and takes response times drawn from the
+    given distributions.
+    """
+
+    # The answers are used in virtual time, a visual.Window doesn't need to wait for them
+    realtime = False
+
+    def __init__(self, accuracy=0.9, rt_distribution=None, slide_rt_distribution=None, choice_rt_distribution=None,
+                 seed=None, answer="No thoughts"):
+        """ Creates a simulated participant
+
+        @param float accuracy: The chance of pressing the right key in a trial
+        @param rt_distribution: The distribution of response times in trials (see ex_gaussian)
+        @param slide_rt_distribution: The distribution of time spent on each instruction slide
+        @param choice_rt_distribution: The distribution of time spent on each question
+        @param int|None seed: Seed for the participant's choices, or None for a random seed
+        @param str answer: What to answer to open ended questions
+        """
+        self.accuracy = accuracy
+        self.rt_distribution = rt_distribution if rt_distribution is not None else ex_gaussian()
+        self.slide_rt_distribution = slide_rt_distribution if slide_rt_distribution is not None else fixed(1.0)
+        self.choice_rt_distribution = (choice_rt_distribution if choice_rt_distribution is not None
+                                       else ex_gaussian(2.0, 0.5, 1.0))
+        self.answer = answer
+        self.rng = random.Random(seed)
+
+    def press_key(self, stimulus, keys, config):
+        """ Decide which key to press when keys are being waited for, while stimulus is on the screen
+
+        @param str|None stimulus: The text on the screen, or None if it's an image
+        @param list[str] keys: The keys that can be pressed
+        @param config.Configuration config:
+        @return: The key to press and how long it takes to press it, in s
+        @rtype: (str, float)
+        """
+        if stimulus is None:
+            return keys[0], self.slide_rt_distribution(self.rng)
+
+        # Stimuli look like '# A #'
+        character = stimulus.split()[1]
+        right_key = config.letter_key if character.isalpha() else config.number_key
+        wrong_keys = [key for key in keys if key.lower() != right_key.lower()]
+
+        if len(wrong_keys) == 0 or self.rng.random() < self.accuracy:
+            key = right_key
+        else:
+            key = self.rng.choice(wrong_keys)
+        return key, self.rt_distribution(self.rng)
+
+    def choose(self, prompt, choices):
+        """ Decide what to answer to a multiple choice question
+
+        @param str prompt:
+        @param list[str] choices:
+        @return: The choice and how long it takes to make it, in s
+        @rtype: (str, float)
+        """
+        return self.rng.choice(choices), self.choice_rt_distribution(self.rng)
+
+    def type_text(self, prompt):
+        """ Decide what to answer to an open ended question
+
+        @param str prompt:
+        @return: The answer and how long it takes to type it, in s
+        @rtype: (str, float)
+        """
+        return self.answer, self.choice_rt_distribution(self.rng)
+
+
+class HeadlessWindow(assets.ImageSequence):
+    """ A window with the same methods as visual.Window, that doesn't show anything and is answered by a
+    simulated participant, in virtual time.
+    """
+
+    def __init__(self, experiment, responder=None, refresh_rate=60.0):
+        """ Initializes the headless window
+
+        @param experiment.Experiment experiment:
+        @param SimulatedResponder|events.ReplayResponder|None responder: Who answers,
+            or None for a default SimulatedResponder
+        @param float refresh_rate: The refresh rate of the pretend display, in Hz
+        """
+        self.experiment = experiment
+        self.responder = responder if responder is not None else SimulatedResponder()
+        self.clock = VirtualClock()
+        self.frame_intervals = FrameIntervals(1.0 / refresh_rate)
+        self._last_flip = 0.0
+        self._hold_end = None
+
+        # All the images we can show
+        self.assets = assets.AssetManifest('images')
+
+        # What is on the screen right now: some text, or None for an image
+        self._stimulus = None
+
+    def _flip(self):
+        """ Wait for the next pretend refresh, and return its time
+
+        @rtype: float
+        """
+        frame_duration = self.frame_intervals.frame_duration
+        # Rounding errors could otherwise put the clock just before a refresh it already reached
+        frames = math.floor(self.clock.getTime() / frame_duration + 1e-6) + 1
+        self.clock.advance(frames * frame_duration - self.clock.getTime())
+        self._last_flip = self.clock.getTime()
+        self.frame_intervals.flip(self._last_flip)
+        return self._last_flip
+
+    def preload_images(self, paths):
+        """ Nothing needs to be loaded to not show images"""
+
+    def warm_up(self):
+        """ Nothing needs to be warmed up, the pretend display always runs at its refresh rate
+
+        @rtype: dict
+        """
+        return {'duration': 0.0, 'draw_duration': 0.0, 'stimuli': 0, 'slowest_draw': 0.0, 'input_duration': 0.0,
+                'refresh_duration': 0.0, 'refresh_rate': 1.0 / self.frame_intervals.frame_duration,
+                'anomalies': []}
+
+    def show_image(self, path):
+        """ Pretend to show the image at the given path
+
+        @param str path:
+        @rtype: StimulusTiming
+        """
+        request_time = self.clock.getTime()
+        self._stimulus = None
+        self._hold_end = None
+        return StimulusTiming(request_time, request_time, self._flip())
+
+    def prepare_text(self, texts, font_size=24, legend=None, legend_font_size=24):
+        """ Nothing needs to be built to not show text"""
+
+    def show_text(self, text, font_size=24, legend=None, legend_font_size=24):
+        """ Pretend to show the text
+
+        @param str text:
+        @rtype: StimulusTiming
+        """
+        request_time = self.clock.getTime()
+        self._stimulus = text
+        self._hold_end = None
+        return StimulusTiming(request_time, request_time, self._flip())
+
+    def prepare_choice(self, prompt, choices, prompt_font_size=24, instruction_font_size=20, choice_font_size=20):
+        """ Nothing needs to be built to not show a question"""
+
+    def wait_for_choice(self, prompt, choices, prompt_font_size=24, instruction_font_size=20, choice_font_size=20,
+                        timestamped=False):
+        """ Let the responder pick one of the choices
+
+        @rtype: str|timing.Choice
+        """
+        self._pause()
+        onset = self.clock.getTime()
+        name, response_time = self.responder.choose(prompt, choices)
+        self.clock.advance(response_time)
+        choice = Choice(name, onset, self.clock.getTime())
+        return choice if timestamped else choice.name
+
+    def wait_for_prompt(self, timer=None, keys='space', timestamped=False):
+        """ Let the responder press one of the keys. If a timer is given and the responder takes longer than it has
+        left, None is returned.
+
+        @rtype: str|timing.KeyPress|None
+        """
+        self._pause()
+
+        if isinstance(keys, str):
+            keys = [keys]
+
+        key, response_time = self.responder.press_key(self._stimulus, keys, self.experiment.config)
+
+        if key is None or (timer is not None and response_time > timer.getTime()):
+            self.clock.advance(response_time if timer is None else min(response_time, timer.getTime()))
+            return None
+
+        self.clock.advance(response_time)
+        key_press = KeyPress(key, self.clock.getTime())
+        return key_press if timestamped else key_press.name
+
+    def get_input_text(self, prompt=None, prompt_font_size=24, input_font_size=20, timestamped=False):
+        """ Let the responder type an answer, at an even pace
+
+        @rtype: str|timing.TypedText
+        """
+        self._pause()
+        onset = self.clock.getTime()
+        text, response_time = self.responder.type_text(prompt)
+        self.clock.advance(response_time)
+        typed = TypedText.evenly(text, onset, self.clock.getTime())
+        return typed if timestamped else typed.text
+
+    def get_time(self):
+        """ The current virtual time, in s
+
+        @rtype: float
+        """
+        return self.clock.getTime()
+
+    def _pause(self):
+        """ Stop pretending to flip every frame"""
+        self.frame_intervals.pause()
+        self._hold_end = None
+
+    def hold(self, frames, wait_for_end=False):
+        """ Keep what is on the screen for the given number of frames, counted from the last flip, like
+        visual.Window.hold. Pretend frames are never late.
+
+        @param int frames:
+        @param bool wait_for_end:
+        @rtype: float
+        """
+        if frames <= 0:
+            return 0.0
+
+        frame_duration = self.frame_intervals.frame_duration
+        start = self._hold_end if self._hold_end is not None else self._last_flip
+        end = self._hold_end = start + frames * frame_duration
+        while self._last_flip + 1.5 * frame_duration < end:
+            self._flip()
+
+        if wait_for_end:
+            self.clock.advance(end - self.clock.getTime())
+        return 0.0
+
+    def close(self):
+        """ Nothing to close"""
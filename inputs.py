@@ -0,0 +1,377 @@
+""" Input backends used by visual.Window to collect the participant's responses"""
+
+import collections
+import queue
+import time
+
+from psychopy import core, event
+
+from timing import Click, KeyPress, Keystroke
+
+
+def create_keyboard():
+    """ Create the best keyboard backend available on this machine.
+    Falls back to polling psychopy.event if the OS event queue can't be used.
+
+    @rtype: QueuedKeyboard|PollingKeyboard
+    """
+    try:
+        return QueuedKeyboard()
+    except (ImportError, RuntimeError):
+        return PollingKeyboard()
+
+
+class QueuedKeyboard:
+    """ A keyboard that reads key presses from the OS event queue (through psychtoolbox), which stamps each key
+    press with the time it was pressed, not with the time it was read. The queue is only read while waiting for a
+    key, so nothing competes with drawing the stimuli the rest of the time.
+    """
+
+    def __init__(self, poll_interval=0.001):
+        """ Starts collecting key presses
+
+        @param float poll_interval: How often (in s) to read the OS queue while waiting for a key
+        """
+        from psychopy.hardware import keyboard
+
+        # Without psychtoolbox, psychopy reads keys through the window's events, which are only read on a flip
+        if not keyboard.havePTB:
+            raise RuntimeError("psychtoolbox is not available")
+
+        self._keyboard = keyboard.Keyboard()
+        self._poll_interval = poll_interval
+
+        # Key presses read from the OS queue that weren't waited for yet, oldest first
+        self._pending = collections.deque()
+
+    def clear(self):
+        """ Forget all key presses that happened so far"""
+        self._keyboard.clearEvents()
+        self._pending.clear()
+
+    def wait(self, keys, timeout=None):
+        """ Waits for one of the keys in keys to be pressed. Other keys are ignored.
+
+        @param list[str] keys: The keys to wait for
+        @param float|None timeout: The maximum time to wait for in s, or None to wait indefinitely
+        @return: The key press, or None if timeout ran out
+        @rtype: KeyPress|None
+        """
+        deadline = None if timeout is None else core.getTime() + timeout
+        while True:
+            self._pending.extend(KeyPress(key.name, key.tDown)
+                                 for key in self._keyboard.getKeys(waitRelease=False, clear=True))
+            while len(self._pending) != 0:
+                key_press = self._pending.popleft()
+                if key_press.name in keys:
+                    return key_press
+
+            if deadline is not None and core.getTime() >= deadline:
+                return None
+            time.sleep(self._poll_interval)
+
+    def close(self):
+        """ Nothing to clean up for this keyboard"""
+
+
+class PollingKeyboard:
+    """ A keyboard that polls psychopy.event for key presses. Key presses are stamped with the
+    time they were read. Used when the OS event queue is not available.
+    """
+
+    def clear(self):
+        """ Forget all key presses that happened so far"""
+        event.clearEvents()
+
+    def wait(self, keys, timeout=None):
+        """ Waits for one of the keys in keys to be pressed. Other keys are ignored.
+
+        @param list[str] keys: The keys to wait for
+        @param float|None timeout: The maximum time to wait for in s, or None to wait indefinitely
+        @return: The key press, or None if timeout ran out
+        @rtype: KeyPress|None
+        """
+        deadline = None if timeout is None else core.getTime() + timeout
+        while True:
+            keys_pressed = event.getKeys(keyList=keys)
+            if len(keys_pressed) != 0:
+                return KeyPress(keys_pressed[0], core.getTime())
+
+            # Checked at least once, even without any time to wait
+            if deadline is not None and core.getTime() >= deadline:
+                return None
+
+    def close(self):
+        """ Nothing to clean up for this keyboard"""
+
+
+def create_mouse(window):
+    """ Create the best mouse backend available for the window.
+    Falls back to polling psychopy.event if the window's events can't be listened to.
+
+    @param psychopy.visual.Window window:
+    @rtype: QueuedMouse|PollingMouse
+    """
+    try:
+        return QueuedMouse(window)
+    except (AttributeError, RuntimeError):
+        return PollingMouse(window)
+
+
+class QueuedMouse:
+    """ A mouse that listens to the window's click events, instead of polling the state of the buttons.
+    Each click is kept until it's read, so no click is missed between checks. Waiting for a click sleeps between
+    checks for events, waking up as often as the polling it replaced (every 10 ms), so it barely uses the CPU.
+
+    The window's events don't have a time, so each click is stamped with the time its event was dispatched, which is
+    up to poll_interval after the click happened. Click times (and so choice latencies) have that resolution.
+    """
+
+    def __init__(self, window, poll_interval=0.01):
+        """ Starts listening to clicks
+
+        @param psychopy.visual.Window window:
+        @param float poll_interval: How often (in s) to check for window events while waiting
+        """
+        if window.winType != 'pyglet':
+            raise RuntimeError("Only pyglet windows send click events")
+
+        self._window = window
+        self._handle = window.winHandle
+        self._poll_interval = poll_interval
+        self._clicks = queue.Queue()
+        self._handle.push_handlers(on_mouse_press=self._on_mouse_press)
+
+    def _on_mouse_press(self, x, y, button, modifiers):
+        """ Keeps left clicks, in px from the center of the window (the window's events can be in points on
+        high resolution displays)"""
+        from pyglet.window import mouse
+
+        if button != mouse.LEFT:
+            return
+
+        scale_x = self._window.size[0] / float(self._handle.width)
+        scale_y = self._window.size[1] / float(self._handle.height)
+        self._clicks.put(Click(x * scale_x - self._window.size[0] / 2.0, y * scale_y - self._window.size[1] / 2.0,
+                               core.getTime()))
+
+    def clear(self):
+        """ Forget all clicks that happened so far"""
+        self._handle.dispatch_events()
+        while True:
+            try:
+                self._clicks.get_nowait()
+            except queue.Empty:
+                return
+
+    def wait(self, timeout=None):
+        """ Waits for a click
+
+        @param float|None timeout: The maximum time to wait for in s, or None to wait indefinitely
+        @return: The click, or None if timeout ran out
+        @rtype: Click|None
+        """
+        deadline = None if timeout is None else core.getTime() + timeout
+        while True:
+            self._handle.dispatch_events()
+            try:
+                return self._clicks.get_nowait()
+            except queue.Empty:
+                pass
+
+            if deadline is not None and core.getTime() >= deadline:
+                return None
+            time.sleep(self._poll_interval)
+
+    def close(self):
+        """ Stop listening to clicks"""
+        self._handle.remove_handlers(on_mouse_press=self._on_mouse_press)
+
+
+class PollingMouse:
+    """ A mouse that polls psychopy.event for the state of its buttons. Clicks are stamped with the time they were
+    read, up to poll_interval after they happened. Used when the window's events can't be listened to.
+    """
+
+    def __init__(self, window, poll_interval=0.01):
+        """ Creates the mouse
+
+        @param psychopy.visual.Window window: A window in norm units
+        @param float poll_interval: How often (in s) to poll the buttons
+        """
+        self._window = window
+        self._mouse = event.Mouse(win=window)
+        self._poll_interval = poll_interval
+        self._pressed = False
+
+    def clear(self):
+        """ Forget all clicks that happened so far"""
+        self._mouse.clickReset()
+        self._pressed = bool(self._mouse.getPressed()[0])
+
+    def wait(self, timeout=None):
+        """ Waits for a click
+
+        @param float|None timeout: The maximum time to wait for in s, or None to wait indefinitely
+        @return: The click, or None if timeout ran out
+        @rtype: Click|None
+        """
+        deadline = None if timeout is None else core.getTime() + timeout
+        while True:
+            pressed = bool(self._mouse.getPressed()[0])
+            if pressed and not self._pressed:
+                self._pressed = True
+                # The position is in norm, like the window
+                x, y = self._mouse.getPos()
+                return Click(x * self._window.size[0] / 2.0, y * self._window.size[1] / 2.0, core.getTime())
+            self._pressed = pressed
+
+            if deadline is not None and core.getTime() >= deadline:
+                return None
+            time.sleep(self._poll_interval)
+
+    def close(self):
+        """ Nothing to clean up for this mouse"""
+
+
+def create_text_input(window):
+    """ Create the best backend available for typing text in the window.
+    Falls back to polling psychopy.event if the window's events can't be listened to.
+
+    @param psychopy.visual.Window window:
+    @rtype: QueuedTextInput|PollingTextInput
+    """
+    try:
+        return QueuedTextInput(window)
+    except (AttributeError, RuntimeError):
+        return PollingTextInput()
+
+
+class QueuedTextInput:
+    """ Listens to the window's text events, which have the text each keystroke typed (with shift, punctuation and
+    the layout of the keyboard already taken into account). Keystrokes are stamped with the time their event was
+    received and kept in the order they were typed until they're read, so no keystroke is lost or reordered
+    between reads. Backspace and escape don't type anything, so they're taken from the key press events.
+    """
+
+    def __init__(self, window, poll_interval=0.002):
+        """ Starts listening to keystrokes
+
+        @param psychopy.visual.Window window:
+        @param float poll_interval: How often (in s) to check for window events while waiting
+        """
+        if window.winType != 'pyglet':
+            raise RuntimeError("Only pyglet windows send text events")
+
+        self._handle = window.winHandle
+        self._poll_interval = poll_interval
+        self._keystrokes = queue.Queue()
+        self._handle.push_handlers(on_text=self._on_text, on_key_press=self._on_key_press)
+
+    def _on_text(self, text):
+        """ Keeps the text typed. Enter types a carriage return, which is kept as a new line"""
+        self._keystrokes.put(Keystroke(text.replace('\r', '\n'), '', core.getTime()))
+
+    def _on_key_press(self, symbol, modifiers):
+        """ Keeps the keys that edit the text instead of typing"""
+        from pyglet.window import key
+
+        if symbol in (key.BACKSPACE, key.ESCAPE):
+            self._keystrokes.put(Keystroke('', key.symbol_string(symbol).lower(), core.getTime()))
+
+    def clear(self):
+        """ Forget all keystrokes that happened so far"""
+        self._handle.dispatch_events()
+        while True:
+            try:
+                self._keystrokes.get_nowait()
+            except queue.Empty:
+                return
+
+    def wait(self, timeout=None):
+        """ Waits for at least one keystroke, and returns all the keystrokes typed since the last call
+
+        @param float|None timeout: The maximum time to wait for in s, or None to wait indefinitely
+        @return: The keystrokes, in the order they were typed. Empty if timeout ran out
+        @rtype: list[Keystroke]
+        """
+        deadline = None if timeout is None else core.getTime() + timeout
+        while True:
+            self._handle.dispatch_events()
+            keystrokes = []
+            while True:
+                try:
+                    keystrokes.append(self._keystrokes.get_nowait())
+                except queue.Empty:
+                    break
+
+            if len(keystrokes) != 0 or (deadline is not None and core.getTime() >= deadline):
+                return keystrokes
+            time.sleep(self._poll_interval)
+
+    def close(self):
+        """ Stop listening to keystrokes"""
+        self._handle.remove_handlers(on_text=self._on_text, on_key_press=self._on_key_press)
+
+
+# The text typed by the keys that psychopy names, without and with shift (as on a US keyboard)
+CHARACTERS = {'space': (' ', ' '), 'return': ('\n', '\n'), 'comma': (',', '<'), 'period': ('.', '>'),
+              'slash': ('/', '?'), 'semicolon': (';', ':'), 'apostrophe': ("'", '"'), 'minus': ('-', '_'),
+              'equal': ('=', '+'), 'bracketleft': ('[', '{'), 'bracketright': (']', '}'), 'backslash': ('\\', '|'),
+              'grave': ('`', '~')}
+CHARACTERS.update({digit: (digit, shifted) for digit, shifted in zip('1234567890', '!@#$%^&*()')})
+
+
+class PollingTextInput:
+    """ Polls psychopy.event for the keys pressed, and works out the text they typed from their names and whether
+    shift or caps lock were on. Keystrokes are stamped with the time psychopy received them. Used when the window's
+    events can't be listened to.
+    """
+
+    def __init__(self, poll_interval=0.002):
+        """ Creates the text input
+
+        @param float poll_interval: How often (in s) to poll the keys
+        """
+        self._poll_interval = poll_interval
+
+    @staticmethod
+    def _keystroke(name, modifiers, key_time):
+        """ The keystroke of the key psychopy named, or None if it neither types nor edits
+
+        @rtype: Keystroke|None
+        """
+        if name in ('backspace', 'escape'):
+            return Keystroke('', name, key_time)
+
+        shift = bool(modifiers.get('shift'))
+        if len(name) == 1 and name.isalpha():
+            upper = shift != bool(modifiers.get('capslock'))
+            return Keystroke(name.upper() if upper else name, '', key_time)
+        if name in CHARACTERS:
+            return Keystroke(CHARACTERS[name][shift], '', key_time)
+        return None
+
+    def clear(self):
+        """ Forget all keystrokes that happened so far"""
+        event.clearEvents()
+
+    def wait(self, timeout=None):
+        """ Waits for at least one keystroke, and returns all the keystrokes typed since the last call
+
+        @param float|None timeout: The maximum time to wait for in s, or None to wait indefinitely
+        @return: The keystrokes, in the order they were typed. Empty if timeout ran out
+        @rtype: list[Keystroke]
+        """
+        deadline = None if timeout is None else core.getTime() + timeout
+        while True:
+            keystrokes = [self._keystroke(name, modifiers, key_time)
+                          for name, modifiers, key_time in event.getKeys(modifiers=True, timeStamped=True)]
+            keystrokes = [keystroke for keystroke in keystrokes if keystroke is not None]
+
+            if len(keystrokes) != 0 or (deadline is not None and core.getTime() >= deadline):
+                return keystrokes
+            time.sleep(self._poll_interval)
+
+    def close(self):
+        """ Nothing to clean up for this text input"""
@@ -1,11 +1,21 @@
-from random import choice, random
+import records
+
+
+class QuestionDataPoint(records.Record):
+    """ The fields saved for every question of the post-task, so both types of questions can be saved together.
+    Each type of question leaves the fields it doesn't have empty.
+    """
+    FIELDS = (('question', str), ('options', list), ('user_response', str), ('choice_latency', float),
+              ('keystrokes', list), ('keystroke_times', list))
+    __slots__ = records.slots(FIELDS)
 
 
 class MultipleChoiceQuestion:
     """ A class for asking multiple choice questions"""
 
-    class DataPoint:
-        """ A DataPoint for this multiple choice question"""
+    class DataPoint(QuestionDataPoint):
+        """ A DataPoint for this multiple choice question. It has no keystrokes"""
+        __slots__ = ()
 
         def __init__(self, question, options, config):
             """ Initialize a DataPoint
@@ -14,10 +24,9 @@ class MultipleChoiceQuestion:
             @param list of str options:
             @param config.Configuration config:
             """
+            super().__init__(config)
             self.question = question
             self.options = options
-            self.__parent = config
-            self.user_response = None
 
     def __init__(self, experiment, question, options, prompt_font_size=40):
         """ Initializes this Question
@@ -34,28 +43,36 @@ class MultipleChoiceQuestion:
 
         self.to_save = self.DataPoint(question, options, self.config)
 
+    def prepare(self):
+        """ Build this question's screen ahead of time, so it shows right away when it's asked"""
+        self.window.prepare_choice(self.to_save.question, self.to_save.options, prompt_font_size=self.prompt_font_size)
+
     def ask(self):
         """ Ask this question and record the response"""
-        self.to_save.user_response = self.experiment.window.wait_for_choice(self.to_save.question,
-                                                                            self.to_save.options,
-                                                                            prompt_font_size=self.prompt_font_size)
+        choice = self.window.wait_for_choice(self.to_save.question, self.to_save.options,
+                                             prompt_font_size=self.prompt_font_size, timestamped=True)
+        self.to_save.user_response = choice.name
+        # Measured from when the choices actually appeared on the screen
+        self.to_save.choice_latency = choice.latency
         self.experiment.push_data(self.to_save)
 
 
 class OpenEndedQuestion:
     """ A class for asking open ended questions"""
 
-    class DataPoint:
-        """ A DataPoint for this multiple choice question"""
+    class DataPoint(QuestionDataPoint):
+        """ A DataPoint for this open ended question. It has no options or choice latency, and its keystrokes are
+        only saved if config.record_keystrokes is on
+        """
+        __slots__ = ()
 
         def __init__(self, question, config):
             """ Initialize a DataPoint
 
             @param str question:
             @param config.Configuration config: """
+            super().__init__(config)
             self.question = question
-            self.__parent = config
-            self.user_response = None
 
     def __init__(self, experiment, question):
         """ Initializes this Question class with question {question},
@@ -72,18 +89,40 @@ class OpenEndedQuestion:
 
     def ask(self):
         """ Ask this question and record the response"""
-        self.to_save.user_response = self.window.get_input_text(self.to_save.question, prompt_font_size=24)
+        typed = self.window.get_input_text(self.to_save.question, prompt_font_size=24, timestamped=True)
+        self.to_save.user_response = typed.text
+        if self.config.record_keystrokes:
+            # What each keystroke typed and when, from when the question appeared on the screen
+            self.to_save.keystrokes = typed.keystroke_names
+            self.to_save.keystroke_times = typed.keystroke_times
         self.experiment.push_data(self.to_save)
 
 
-def random_number():
-    """ Return a random number char allowed in this task (from 2 to 8 inclusive)"""
-    return choice("2345678")
+def random_number(rng):
+    """ Return a random number char allowed in this task (from 2 to 8 inclusive)
+
+    @param random.Random rng:
+    """
+    return rng.choice("2345678")
+
+
+def random_letter(rng):
+    """ Return a random upper-case letter char allowed in this task (A - H inclusive)
+
+    @param random.Random rng:
+    """
+    return rng.choice("ABCDEFGH")
 
 
-def random_letter():
-    """ Return a random upper-case letter char allowed in this task (A - H inclusive)"""
-    return choice("ABCDEFGH")
+def check_assets(experiment):
+    """ Make sure all the images the post-task shows exist, so we don't find out mid-session
+
+    @param experiment.Experiment experiment:
+    @rtype: None
+    """
+    experiment.window.assets.require([('post-task', 'instructions', 'start'),
+                                      ('post-task', 'instructions', 'before_corr_questions'),
+                                      ('post-task', 'instructions', 'end')])
 
 
 def run(experiment):
@@ -91,9 +130,6 @@ def run(experiment):
     # Start a new section of the experiment we are in
     experiment.new_section('post-task')
 
-    # Show some slides before the post-task
-    experiment.window.show_image_sequence('instructions', 'start')
-
     # The answers that people can give
     yes_no_answer = ["Yes", "No"]
     quantity_answer = ["Very little", "A bit", "A lot"]
@@ -105,14 +141,26 @@ def run(experiment):
     open_ended = OpenEndedQuestion(experiment, prompt)
 
     # Create the number questions and alphabetic questions
-    number_questions = [MultipleChoiceQuestion(experiment, "{0} {1} {0}".format(c, random_number()), quantity_answer)
+    number_questions = [MultipleChoiceQuestion(experiment, "{0} {1} {0}".format(c, random_number(experiment.rng)),
+                                               quantity_answer)
                         for c in "#@*"]
-    alpha_questions = [MultipleChoiceQuestion(experiment, "{0} {1} {0}".format(c, random_letter()), quantity_answer)
+    alpha_questions = [MultipleChoiceQuestion(experiment, "{0} {1} {0}".format(c, random_letter(experiment.rng)),
+                                              quantity_answer)
                        for c in "#@*"]
 
     # Half the time number questions should come first,
     # the other half alphabetic questions
-    questions = number_questions + alpha_questions if random() > 0.5 else alpha_questions + number_questions
+    if experiment.rng.random() > 0.5:
+        questions = number_questions + alpha_questions
+    else:
+        questions = alpha_questions + number_questions
+
+    # Build the questions' screens before the slides, so each shows right away when it's asked
+    for question in [noticed_relationship] + questions:
+        question.prepare()
+
+    # Show some slides before the post-task
+    experiment.window.show_image_sequence('instructions', 'start')
 
     # Ask if they noticed any relationships
     noticed_relationship.ask()
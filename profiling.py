@@ -0,0 +1,166 @@
+""" Timing spans around the phases of the experiment, cheap enough to leave on during real sessions.
+
+Spans are kept in a ring buffer in memory, and are summed up per span name into a timing table saved with the data.
+For deep dives, the whole session can also be captured with cProfile or pyinstrument. Turned on with profiling
+(and profiling_capture) in config.py.
+"""
+
+import collections
+import csv
+import os
+import time
+
+
+# How many spans are kept. A session has a few thousand
+CAPACITY = 100000
+
+# The ways a whole session can be captured, and the extension of the file they're saved in
+CAPTURES = {'cprofile': '.prof', 'pyinstrument': '.html'}
+
+
+class _Span:
+    """ Times the code in a with block"""
+    __slots__ = ('spans', 'name', 'start')
+
+    def __init__(self, spans, name):
+        self.spans = spans
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.spans.append((self.name, self.start, time.perf_counter() - self.start))
+
+
+class _NoSpan:
+    """ Times nothing, when profiling is off"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+def check_capture(capture):
+    """ Make sure the capture mode is known and can be used, so we don't find out at the end of a session
+
+    @param str|None capture: None, or one of CAPTURES
+    @rtype: None
+    """
+    if capture is None:
+        return
+    if capture not in CAPTURES:
+        raise ValueError("Unknown profiling capture '{0}', expected one of {1}".format(capture, list(CAPTURES)))
+    if capture == 'pyinstrument':
+        import pyinstrument  # noqa: F401
+
+
+class Profiler:
+    """ Keeps the spans of a session, and optionally captures the whole session"""
+
+    def __init__(self, enabled=False, capture=None, capacity=CAPACITY):
+        """ Starts profiling, if enabled
+
+        @param bool enabled: Whether to keep spans
+        @param str|None capture: None, or one of CAPTURES to also capture the whole session
+        @param int capacity: How many spans to keep. The oldest are forgotten first
+        """
+        check_capture(capture)
+        self.enabled = enabled
+        self.capture = capture
+        self.spans = collections.deque(maxlen=capacity)
+
+        self._capturer = None
+        if capture == 'cprofile':
+            import cProfile
+            self._capturer = cProfile.Profile()
+            self._capturer.enable()
+        elif capture == 'pyinstrument':
+            import pyinstrument
+            self._capturer = pyinstrument.Profiler()
+            self._capturer.start()
+
+    def span(self, name):
+        """ Time the code in a with block, like: with profiler.span('trial.input'): ...
+
+        @param str name:
+        """
+        if not self.enabled:
+            return _NO_SPAN
+        return _Span(self.spans, name)
+
+    def table(self):
+        """ The spans summed up per name, in the order they first happened: how many there were, and their total,
+        mean, median, 95th percentile and maximum duration in ms
+
+        @rtype: list[dict]
+        """
+        import numpy
+
+        durations = collections.OrderedDict()
+        for name, start, duration in self.spans:
+            durations.setdefault(name, []).append(duration)
+
+        rows = []
+        for name, values in durations.items():
+            values = numpy.array(values) * 1000
+            rows.append({'span': name, 'count': len(values), 'total_ms': values.sum(), 'mean_ms': values.mean(),
+                         'p50_ms': numpy.percentile(values, 50), 'p95_ms': numpy.percentile(values, 95),
+                         'max_ms': values.max()})
+        return rows
+
+    def save(self, path):
+        """ Save the timing table to "{path}.csv", and the capture (if any) next to it.
+        Can be saved again later in the session, with everything up to then.
+
+        @param str path: The path to save to, without an extension
+        @rtype: None
+        """
+        if not self.enabled and self.capture is None:
+            return
+
+        directory = os.path.dirname(path)
+        if directory != '' and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        if self.enabled:
+            columns = ['span', 'count', 'total_ms', 'mean_ms', 'p50_ms', 'p95_ms', 'max_ms']
+            with open(path + '.csv', 'w', newline='') as table_file:
+                writer = csv.DictWriter(table_file, columns, lineterminator='\n')
+                writer.writeheader()
+                writer.writerows(self.table())
+
+        if self.capture == 'cprofile':
+            self._capturer.disable()
+            self._capturer.dump_stats(path + CAPTURES['cprofile'])
+            self._capturer.enable()
+        elif self.capture == 'pyinstrument':
+            self._capturer.stop()
+            with open(path + CAPTURES['pyinstrument'], 'w') as capture_file:
+                capture_file.write(self._capturer.output_html())
+            self._capturer.start()
+
+    def close(self):
+        """ Stop capturing"""
+        if self.capture == 'cprofile':
+            self._capturer.disable()
+        elif self.capture == 'pyinstrument' and self._capturer.is_running:
+            self._capturer.stop()
+
+
+def profile_path(output_location, participant, session_id):
+    """ Where the timing table (and capture) of a session is saved, without an extension
+
+    @param str output_location:
+    @param str participant:
+    @param str session_id:
+    @rtype: str
+    """
+    return os.path.join(output_location, 'profile', "{0}.{1}".format(participant, session_id))
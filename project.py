@@ -1,21 +1,110 @@
 """ Code for running the Smiley experiment.
+
+Run without arguments to ask for the participant in a dialog. Run with --headless to run a simulated participant
+without a display, like: python project.py --headless --participant 12 --age-group adult
+
+Every session's events are logged in {output}/events. Run with --replay to run a logged session again, with the same
+stimuli and the same answers, like: python project.py --headless --replay data/events/12.{session id}.jsonl
 """
-# import some libraries
+# import some libraries. startup goes first, so it times the rest
+import startup
+import argparse
+
 from experiment import Experiment
-import task
-import post_task
 
-# ---------------- SETUP --------------------
-# Make an Experiment object to store the experiment info
-experiment = Experiment()
 
-# ---------------- MAIN PROGRAM --------------------
+def start(participant=None, age_group='', window_factory=None, seed=None, output_location=None):
+    """ Everything that happens before the first instructions: asks for the participant (if not given), opens the
+    window, checks the images and warms up. psychopy and numpy are loaded in the background while the dialog is open.
+
+    @param str|None participant: The participant id, or None to ask for it (and the age group) in a dialog
+    @param str age_group:
+    @param window_factory: See experiment.Experiment
+    @param int|None seed:
+    @param str|None output_location:
+    @rtype: experiment.Experiment
+    """
+    startup.mark('imports')
+    startup.import_in_background(['schedule'] + (['visual'] if window_factory is None else []))
+
+    # Make an Experiment object to store the experiment info
+    experiment = Experiment(participant, age_group, window_factory, seed, output_location)
+
+    import task
+    import post_task
+
+    # Make sure all the images we'll show exist before starting
+    task.check_assets(experiment)
+    post_task.check_assets(experiment)
+
+    # Build and draw everything once before the first trial, and measure the display
+    task.prepare(experiment)
+    warm_up = experiment.warm_up()
+    for anomaly in warm_up['anomalies']:
+        print("Warm up: " + anomaly)
+
+    return experiment
+
+
+def main():
+    """ Run a session from the command line"""
+    # ---------------- SETUP --------------------
+    parser = argparse.ArgumentParser(description="Run the Smiley experiment.")
+    parser.add_argument('--participant', help="The participant id. Asked for in a dialog if not given")
+    parser.add_argument('--age-group', default='', help="The participant's age group")
+    parser.add_argument('--headless', action='store_true', help="Run a simulated participant without a display")
+    parser.add_argument('--accuracy', type=float, default=0.9, help="How often the simulated participant is right")
+    parser.add_argument('--seed', type=int,
+                        help="The seed of the session. Defaults to one made from the participant id")
+    parser.add_argument('--output', help="Where to save the data, instead of the configured location")
+    parser.add_argument('--replay', metavar='LOG', help="Replay the session logged in this event log")
+    parser.add_argument('--realtime', action='store_true', help="When replaying on a display, wait as long as the "
+                                                                 "participant did before each answer")
+    args = parser.parse_args()
+
+    responder = None
+    output_location = args.output
+    if args.replay is not None:
+        import events
+
+        responder = events.ReplayResponder(args.replay, args.realtime)
+        args.participant = responder.session['participant']
+        args.age_group = responder.session['age_group']
+        args.seed = responder.session['seed']
+        if output_location is None:
+            output_location = 'replay'
+
+    window_factory = None
+    if args.headless:
+        import headless
+
+        if args.participant is None:
+            parser.error("--headless needs a --participant")
+
+        if responder is None:
+            responder = headless.SimulatedResponder(accuracy=args.accuracy, seed=args.seed)
+        window_factory = lambda experiment: headless.HeadlessWindow(experiment, responder)
+    elif responder is not None:
+        import visual
+
+        window_factory = lambda experiment: visual.Window(experiment, responder=responder)
+
+    experiment = start(args.participant, args.age_group, window_factory, args.seed, output_location)
+    print("Started in {waiting:.2f}s (not counting the dialog)".format(**startup.report()))
+
+    # ---------------- MAIN PROGRAM --------------------
+    import task
+    import post_task
+
+    # Run task
+    task.run(experiment)
+
+    # Run post-task
+    post_task.run(experiment)
 
-# Run task
-task.run(experiment)
+    # cleanup
+    experiment.close()
 
-# Run post-task
-post_task.run(experiment)
 
-# cleanup
-experiment.close()
+if __name__ == '__main__':
+    main()
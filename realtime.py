@@ -0,0 +1,97 @@
+""" A performance mode for the blocks of the task, so the garbage collector and the OS get in the way less.
+
+While a block runs, the cyclic garbage collector is off and the process runs at a higher priority (through
+psychopy's core.rush). Garbage is collected at the break after each block instead. The whole session can also be
+pinned to a single CPU core. Turned on with realtime_mode in config.py.
+"""
+
+import contextlib
+import gc
+import os
+import time
+
+
+class RealtimeMode:
+    """ Applies the performance mode around blocks, and keeps track of what it could apply"""
+
+    def __init__(self, enabled, cpu=None):
+        """ Creates the mode, and pins the process to cpu right away
+
+        @param bool enabled: Whether to turn off the garbage collector and raise the priority during blocks
+        @param int|None cpu: The CPU core to pin the process to, or None to not pin it
+        """
+        self.enabled = enabled
+        self.cpu = cpu
+
+        # Whether raising the priority and pinning worked, or None if they weren't tried
+        self.rushed = None
+        self.pinned = None
+
+        # The garbage collections done between blocks, and how long they took in total
+        self.collections = 0
+        self.collection_time = 0.0
+
+        if cpu is not None:
+            self._pin()
+
+    def _pin(self):
+        """ Pin the process to self.cpu. Only possible on Linux"""
+        if not hasattr(os, 'sched_setaffinity'):
+            self.pinned = False
+            return
+
+        try:
+            os.sched_setaffinity(0, {self.cpu})
+            self.pinned = True
+        except OSError:
+            self.pinned = False
+
+    def _rush(self, value):
+        """ Raise (or restore) the priority of the process with psychopy's core.rush
+
+        @param bool value:
+        @rtype: bool
+        """
+        try:
+            from psychopy import core
+        except ImportError:
+            return False
+        return bool(core.rush(value))
+
+    @contextlib.contextmanager
+    def block(self):
+        """ Run a block in the performance mode, if it's enabled. Garbage is collected when the block ends."""
+        if not self.enabled:
+            yield
+            return
+
+        # Start without garbage, and don't look at everything that was made before the block again
+        self.collect()
+        if hasattr(gc, 'freeze'):
+            gc.freeze()
+        gc.disable()
+        self.rushed = self._rush(True)
+        try:
+            yield
+        finally:
+            if self.rushed:
+                self._rush(False)
+            gc.enable()
+            if hasattr(gc, 'unfreeze'):
+                gc.unfreeze()
+            self.collect()
+
+    def collect(self):
+        """ Collect all garbage now, keeping track of how long it took"""
+        start = time.perf_counter()
+        gc.collect()
+        self.collection_time += time.perf_counter() - start
+        self.collections += 1
+
+    def status(self):
+        """ What the mode is set to and what of it could be applied, to be saved with the data
+
+        @rtype: dict
+        """
+        return {'enabled': self.enabled, 'cpu': self.cpu, 'rushed': self.rushed, 'pinned': self.pinned,
+                'collections': self.collections, 'collection_time': self.collection_time}
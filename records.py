@@ -0,0 +1,148 @@
+""" Typed records for the data points the experiment saves, and a column-oriented buffer to keep them in"""
+
+from array import array
+
+
+# The array typecode used to store each type of field. Fields of other types are stored in lists
+TYPECODES = {float: 'd', int: 'q', bool: 'b'}
+
+
+def slots(fields):
+    """ The __slots__ of a record with the given fields
+
+    @param tuple[(str, type)] fields:
+    @rtype: tuple[str]
+    """
+    return tuple(name for name, _ in fields)
+
+
+def constants(config):
+    """ The values of all the configuration's variables, with booleans as 0 or 1
+
+    @param config.Configuration config:
+    @rtype: dict
+    """
+    return {key: int(value) if type(value) is bool else value for key, value in vars(config).items()}
+
+
+class Record:
+    """ A data point with a fixed set of typed fields.
+
+    Subclasses declare their fields as (name, type) pairs in FIELDS, and set __slots__ = slots(FIELDS).
+    A record can have a parent (another Record, or the config.Configuration) whose fields are saved along with
+    its own.
+    """
+    __slots__ = ('parent',)
+    FIELDS = ()
+
+    def __init__(self, parent=None):
+        """ Creates a record with the given parent, and all of its fields set to None
+
+        @param Record|config.Configuration|None parent:
+        """
+        self.parent = parent
+        for name, _ in self.FIELDS:
+            setattr(self, name, None)
+
+
+class Schema:
+    """ The columns saved for a type of record: its own fields, then its parents' fields. The configuration at the
+    root doesn't change within a section, so it's saved once in the section's session file instead (see constants).
+    """
+
+    def __init__(self, record):
+        """ Resolves the schema of record by walking its parents
+
+        @param Record record:
+        """
+        # The types of record that have the same columns, and so can be saved along with this one
+        self._record_types = {type(record)}
+
+        # The names of the fields to read at each level of parents
+        self._levels = []
+        self.columns = []
+        self.types = []
+
+        node = record
+        while isinstance(node, Record):
+            self._levels.append(slots(node.FIELDS))
+            self.columns += [name for name, _ in node.FIELDS]
+            self.types += [field_type for _, field_type in node.FIELDS]
+            node = node.parent
+
+        self._bools = [i for i in range(len(self.types)) if self.types[i] is bool]
+
+    def matches(self, record):
+        """ Whether the record has the same columns as this schema, so it can be saved with the same schema
+
+        @param Record record:
+        @rtype: bool
+        """
+        if type(record) not in self._record_types:
+            if not isinstance(record, Record) or Schema(record).columns != self.columns:
+                return False
+            self._record_types.add(type(record))
+        return True
+
+    def values(self, record):
+        """ The values of the record's (and its parents') fields, in the order of columns.
+        Booleans are saved as 0 or 1.
+
+        @param Record record:
+        @rtype: list
+        """
+        values = []
+        node = record
+        for names in self._levels:
+            values += [getattr(node, name) for name in names]
+            node = node.parent
+
+        for i in self._bools:
+            if values[i] is not None:
+                values[i] = int(values[i])
+
+        return values
+
+
+class ColumnBuffer:
+    """ Keeps the values of many records of one schema, one column at a time.
+    Numeric columns are kept in arrays, other columns in lists.
+    """
+
+    def __init__(self, schema):
+        """ Creates an empty buffer for records of schema
+
+        @param Schema schema:
+        """
+        self.schema = schema
+        self.length = 0
+        self._columns = [array(TYPECODES[field_type]) if field_type in TYPECODES else []
+                         for field_type in schema.types]
+
+    def append(self, values):
+        """ Adds the values of a record to the buffer
+
+        @param list values: Values in the order of schema.columns, as given by Schema.values
+        @rtype: None
+        """
+        for i in range(len(values)):
+            value = values[i]
+            column = self._columns[i]
+
+            if value is None and isinstance(column, array):
+                if column.typecode == 'd':
+                    value = float('nan')
+                else:
+                    # Integers can't be missing in an array, so keep this column in a list from now on
+                    column = self._columns[i] = list(column)
+
+            column.append(value)
+
+        self.length += 1
+
+    def columns(self):
+        """ The columns of the buffer, by name. Numeric columns are arrays, the rest are lists.
+
+        @rtype: dict[str, array|list]
+        """
+        return dict(zip(self.schema.columns, self._columns))
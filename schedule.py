@@ -0,0 +1,202 @@
+""" Generates the counterbalanced schedule of trials for whole sessions at once.
+
+A schedule is a dict of numpy arrays, one per column, with a row for every trial of the session (the practice block
+first, if there is one). Schedules for many participants are generated together, with an extra first dimension.
+Run this file to generate and store the schedules of a whole study, like:
+
+    python schedule.py --participants 1-400 --output schedules.npz
+"""
+
+import argparse
+from collections import namedtuple
+
+import numpy
+
+
+LETTERS = 'ABCDEFGH'
+NUMBERS = '23456789'
+
+# The flankers, in the order their codes refer to
+FLANKERS = numpy.array(['#', '@', '*'])
+PRACTICE_FLANKER = '$'
+
+BLOCKS = 6
+TRIALS_PER_BLOCK = 64
+
+# Each character is shown this many times per block
+REPEATS = 4
+
+# Trials per practice block, for each type of character
+PRACTICE_TRIALS = 5
+
+
+# A trial of a block, with the columns of the schedule the task saves for it
+ScheduledTrial = namedtuple('ScheduledTrial', ['char', 'flanker', 'type', 'right_key', 'helpful'])
+
+
+def _shuffled(rng, shape, values):
+    """ Copies of values, independently shuffled, for each index of shape
+
+    @param numpy.random.Generator rng:
+    @param tuple shape:
+    @param numpy.ndarray values: 1-D
+    @rtype: numpy.ndarray
+    """
+    order = numpy.argsort(rng.random(shape + (len(values),)), axis=-1)
+    return values[order]
+
+
+def block_amounts(rng, letters_corr_at):
+    """ How many times letters and numbers are shown with the '@' flanker in each block, for each participant.
+    The rest of their 24 trials with '@' or '*' flankers have the '*' flanker.
+
+    If letters_corr_at is True, letters are shown with '@' 21 times in 4 random blocks and 22 times in the
+    other 2, and numbers are shown with '*' 21 times in 4 random blocks and 22 times in the other 2.
+    If it's False, the roles of letters and numbers are switched.
+
+    @param numpy.random.Generator rng:
+    @param numpy.ndarray letters_corr_at: Boolean, one per participant
+    @return: The amounts for letters and for numbers, each of shape (participants, blocks)
+    @rtype: (numpy.ndarray, numpy.ndarray)
+    """
+    base = numpy.array([21] * 4 + [22] * 2)
+    shape = (len(letters_corr_at),)
+
+    mostly_at = _shuffled(rng, shape, base)
+    rarely_at = 24 - _shuffled(rng, shape, base)
+
+    letters_corr_at = letters_corr_at[:, None]
+    return numpy.where(letters_corr_at, mostly_at, rarely_at), numpy.where(letters_corr_at, rarely_at, mostly_at)
+
+
+def _flanker_codes(matched):
+    """ The flanker codes for the 32 trials of one type of character in each block, in order: 8 '#',
+    then matched '@', then the rest '*'
+
+    @param numpy.ndarray matched: How many '@' flankers there are in each block
+    @rtype: numpy.ndarray
+    """
+    slots = numpy.arange(TRIALS_PER_BLOCK // 2)
+    return (slots >= 8).astype(numpy.int8) + (slots >= 8 + matched[..., None])
+
+
+def generate(conditions, seed=None, practice_run=True, task_key1='j', task_key2='f'):
+    """ Generate the schedules of many sessions at once
+
+    @param list[int]|numpy.ndarray conditions: The condition (0 to 3, see config.Configuration) of each session
+    @param int|None seed: The seed to generate the schedules from, or None for a random seed
+    @param bool practice_run: Whether the sessions start with a practice block
+    @param str task_key1: See config.Configuration
+    @param str task_key2: See config.Configuration
+    @return: Columns char, flanker, type, helpful, right_key, block_num and trial_num,
+        each of shape (sessions, trials)
+    @rtype: dict[str, numpy.ndarray]
+    """
+    rng = numpy.random.default_rng(seed)
+    conditions = numpy.asarray(conditions)
+    sessions = len(conditions)
+
+    letters_corr_at = conditions % 2 == 0
+    letter_pair_condition = conditions // 2 == 0
+
+    letters_at, numbers_at = block_amounts(rng, letters_corr_at)
+
+    # Every block has 32 letters then 32 numbers, before being shuffled
+    shape = (sessions, BLOCKS)
+    chars = numpy.concatenate([_shuffled(rng, shape, numpy.array(list(LETTERS * REPEATS))),
+                               _shuffled(rng, shape, numpy.array(list(NUMBERS * REPEATS)))], axis=-1)
+    flankers = FLANKERS[numpy.concatenate([_flanker_codes(letters_at), _flanker_codes(numbers_at)], axis=-1)]
+
+    # Randomize the trial presentation within each block
+    order = numpy.argsort(rng.random((sessions, BLOCKS, TRIALS_PER_BLOCK)), axis=-1)
+    chars = numpy.take_along_axis(chars, order, axis=-1).reshape(sessions, -1)
+    flankers = numpy.take_along_axis(flankers, order, axis=-1).reshape(sessions, -1)
+    block_num = numpy.broadcast_to(numpy.repeat(numpy.arange(BLOCKS), TRIALS_PER_BLOCK), chars.shape)
+    trial_num = numpy.broadcast_to(numpy.tile(numpy.arange(TRIALS_PER_BLOCK), BLOCKS), chars.shape)
+
+    if practice_run:
+        practice_chars = numpy.concatenate([_shuffled(rng, (sessions,), numpy.array(list(LETTERS * REPEATS))),
+                                            _shuffled(rng, (sessions,), numpy.array(list(NUMBERS * REPEATS)))],
+                                           axis=-1)
+        practice_chars = practice_chars[:, numpy.r_[0:PRACTICE_TRIALS, 32:32 + PRACTICE_TRIALS]]
+        order = numpy.argsort(rng.random(practice_chars.shape), axis=-1)
+        practice_chars = numpy.take_along_axis(practice_chars, order, axis=-1)
+
+        chars = numpy.concatenate([practice_chars, chars], axis=-1)
+        flankers = numpy.concatenate([numpy.full(practice_chars.shape, PRACTICE_FLANKER), flankers], axis=-1)
+        block_num = numpy.concatenate([numpy.full(practice_chars.shape, -1), block_num], axis=-1)
+        trial_num = numpy.concatenate([numpy.broadcast_to(numpy.arange(2 * PRACTICE_TRIALS), practice_chars.shape),
+                                       trial_num], axis=-1)
+
+    alphabetic = numpy.isin(chars, list(LETTERS))
+
+    # 1 if the flanker mostly appears with characters of this type, -1 if with the other type, 0 otherwise
+    at_helps = numpy.where(alphabetic, 1, -1) * numpy.where(letters_corr_at, 1, -1)[:, None]
+    helpful = numpy.select([flankers == '@', flankers == '*'], [at_helps, -at_helps], 0)
+
+    letter_key = numpy.where(letter_pair_condition, task_key1, task_key2)[:, None]
+    number_key = numpy.where(letter_pair_condition, task_key2, task_key1)[:, None]
+
+    return {'char': chars,
+            'flanker': flankers,
+            'type': numpy.where(alphabetic, 'alphabetic', 'numeric'),
+            'helpful': helpful,
+            'right_key': numpy.where(alphabetic, letter_key, number_key),
+            'block_num': numpy.array(block_num),
+            'trial_num': numpy.array(trial_num)}
+
+
+def session_schedule(config, seed=None):
+    """ Generate the schedule of a single session
+
+    @param config.Configuration config:
+    @param int|None seed: The seed to generate the schedule from, or None for a random seed
+    @return: The columns of the schedule (see generate), each with a row per trial
+    @rtype: dict[str, numpy.ndarray]
+    """
+    columns = generate([config.condition], seed, config.practice_run, config.task_key1, config.task_key2)
+    return {name: values[0] for name, values in columns.items()}
+
+
+def block_trials(session, block_num):
+    """ The trials of a block of the session, in the order they are shown
+
+    @param dict[str, numpy.ndarray] session: A schedule from session_schedule
+    @param int block_num: The block, or -1 for the practice block
+    @rtype: list[ScheduledTrial]
+    """
+    rows = session['block_num'] == block_num
+    return [ScheduledTrial(*row) for row in zip(*[session[name][rows].tolist() for name in ScheduledTrial._fields])]
+
+
+def parse_participants(text):
+    """ Parse a list of participant numbers like '1-10,15'
+
+    @param str text:
+    @rtype: list[int]
+    """
+    participants = []
+    for part in text.split(','):
+        if '-' in part:
+            start, end = part.split('-')
+            participants += range(int(start), int(end) + 1)
+        else:
+            participants.append(int(part))
+    return participants
+
+
+def main():
+    """ Generate and store the schedules of a whole study from the command line"""
+    parser = argparse.ArgumentParser(description="Generate the trial schedules of many participants at once.")
+    parser.add_argument('--participants', required=True, help="Participant numbers, like 1-400 or 1,2,5")
+    parser.add_argument('--seed', type=int, default=None, help="The seed to generate the schedules from")
+    parser.add_argument('--output', default='schedules.npz', help="Where to store them (default: schedules.npz)")
+    args = parser.parse_args()
+
+    participants = numpy.array(parse_participants(args.participants))
+    columns = generate(participants % 4, args.seed)
+    numpy.savez_compressed(args.output, participant=participants, **columns)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+""" Timing of the start of a session, and loading the heavy modules in the background.
+
+Import this first, so the time it takes to import everything else is measured too. The report is saved in each
+section's session file, and bench_startup.py uses it to track the time it takes to start across versions.
+"""
+
+import importlib
+import threading
+import time
+
+
+# When this module was imported, which is about when the experiment started
+_started = time.perf_counter()
+
+# The end of each phase of the start so far, in order
+_marks = []
+
+
+def mark(phase):
+    """ Mark the end of a phase of the start, like 'imports', 'dialog' or 'window'
+
+    @param str phase:
+    @rtype: None
+    """
+    _marks.append((phase, time.perf_counter()))
+
+
+def report():
+    """ How long each phase of the start took, in s, and in total. The time spent in the dialog is not counted in
+    'waiting', the time spent waiting for the experiment.
+
+    @rtype: dict[str, float]
+    """
+    durations = {}
+    previous = _started
+    for phase, end in _marks:
+        durations[phase] = durations.get(phase, 0.0) + end - previous
+        previous = end
+
+    durations['total'] = previous - _started
+    durations['waiting'] = durations['total'] - durations.get('dialog', 0.0)
+    return durations
+
+
+def _import(names):
+    """ Import the modules with the given names, one after the other"""
+    for name in names:
+        try:
+            importlib.import_module(name)
+        except Exception:
+            # The main thread gets the same error when it imports the module itself
+            pass
+
+
+def import_in_background(names):
+    """ Start importing the modules with the given names on a background thread, so they're loaded by the time
+    they're needed (like while the dialog is open). Importing them later just waits for them to be done.
+
+    @param list[str] names:
+    @rtype: threading.Thread
+    """
+    thread = threading.Thread(target=_import, args=(names,), name="imports", daemon=True)
+    thread.start()
+    return thread
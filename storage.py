@@ -0,0 +1,397 @@
+""" Saving the experiment's data to the disk as it is collected"""
+
+import argparse
+import csv
+import importlib
+import io
+import json
+import os
+import platform
+import queue
+import socket
+import sys
+import threading
+import time
+
+
+# The suffix of files that are still being written to
+PARTIAL_SUFFIX = '.partial'
+
+# Tells the writing thread to stop
+_FINALIZE = object()
+
+
+class StreamingWriter:
+    """ Appends rows to a CSV file as soon as they are written. The rows are written and synced to the disk
+    on a background thread, so a crash loses at most the last fsync_interval seconds of data.
+
+    Rows go to {path}.partial until the writer is finalized, which renames it to path. The session file of the rows
+    (see write_session) is also kept next to {path}.partial, and moved into place along with it, so the session file
+    of an earlier complete file at path is only replaced once the new file replaces it too.
+
+    If the background thread fails to write or sync (like when the disk is full), it stops, and its error is raised by
+    the next write and by finalize, which then leaves the file at {path}.partial to be recovered.
+    """
+
+    def __init__(self, path, columns, constants=None, fsync_interval=0.5):
+        """ Creates the file at {path}.partial and writes the header
+
+        @param str path: Where the file should be once it's finalized
+        @param list[str] columns: The names of the columns of each row
+        @param dict|None constants: Columns added before the others, with the same value in every row
+        @param float fsync_interval: The most time (in s) to wait before syncing written rows to the disk
+        """
+        self.path = path
+        self.partial_path = path + PARTIAL_SUFFIX
+        self.finalized = False
+
+        constants = {} if constants is None else constants
+        self.columns = list(constants) + list(columns)
+        self._constant_values = list(constants.values())
+
+        self._fsync_interval = fsync_interval
+        self._file = open(self.partial_path, 'w', newline='')
+        self._csv = csv.writer(self._file, lineterminator='\n')
+        if len(self.columns) != 0:
+            self._csv.writerow(self.columns)
+
+        # The error that stopped the background thread, if any
+        self._error = None
+
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._write, name="writer", daemon=True)
+        self._thread.start()
+
+    def write(self, row):
+        """ Write a row to the file. Returns immediately, the row is written on the background thread.
+
+        @param list row: The values of the row, in the same order as the columns (without the constants)
+        @rtype: None
+        """
+        if self._error is not None:
+            raise self._error
+        self._queue.put(row)
+
+    def _write(self):
+        """ Writes rows as they come in, until an error stops it"""
+        try:
+            self._write_rows()
+        except Exception as error:
+            self._error = error
+
+    def _write_rows(self):
+        """ Writes rows as they come in, syncing them to the disk at most every fsync_interval seconds"""
+        last_sync = time.time()
+        unsynced = False
+
+        while True:
+            try:
+                row = self._queue.get(timeout=self._fsync_interval)
+            except queue.Empty:
+                row = None
+
+            if row is _FINALIZE:
+                self._sync()
+                return
+
+            if row is not None:
+                # Hand the row to the OS right away, so it survives the program crashing
+                self._csv.writerow(self._constant_values + row)
+                self._file.flush()
+                unsynced = True
+
+            # Only sync every once in a while, so it survives a power loss too
+            if unsynced and time.time() - last_sync >= self._fsync_interval:
+                self._sync()
+                last_sync = time.time()
+                unsynced = False
+
+    def _sync(self):
+        """ Make sure everything written so far is on the disk"""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def finalize(self):
+        """ Write all remaining rows, and move the file to its final path. Does nothing if already finalized.
+        If the rows couldn't all be written, the file is left where it is and the error is raised.
+
+        @rtype: None
+        """
+        if self.finalized:
+            return
+
+        self._queue.put(_FINALIZE)
+        self._thread.join()
+        self._file.close()
+        if self._error is not None:
+            raise self._error
+
+        os.replace(self.partial_path, self.path)
+        if os.path.exists(session_path(self.partial_path)):
+            os.replace(session_path(self.partial_path), session_path(self.path))
+        self.finalized = True
+
+
+def session_path(path):
+    """ The path of the session file that goes along with the data file at path. The session file of a data file
+    that is still being written ({name}.csv.partial) is {name}.session.json.partial
+
+    @param str path:
+    @rtype: str
+    """
+    if path.endswith(PARTIAL_SUFFIX):
+        return session_path(path[:-len(PARTIAL_SUFFIX)]) + PARTIAL_SUFFIX
+    return os.path.splitext(path)[0] + '.session.json'
+
+
+def environment():
+    """ Information about the machine the experiment is running on
+
+    @rtype: dict
+    """
+    psychopy = sys.modules.get('psychopy')
+    return {'hostname': socket.gethostname(),
+            'platform': platform.platform(),
+            'python': platform.python_version(),
+            'psychopy': getattr(psychopy, '__version__', None)}
+
+
+def write_session(path, session):
+    """ Write the session record for the data file at path, replacing it all at once so it's never half-written
+
+    @param str path: The path of the data file
+    @param dict session: The session's id, configuration and environment
+    @rtype: None
+    """
+    temp_path = session_path(path) + PARTIAL_SUFFIX
+    with open(temp_path, 'w') as session_file:
+        json.dump(session, session_file, indent=1, default=str)
+        session_file.flush()
+        os.fsync(session_file.fileno())
+    os.replace(temp_path, session_path(path))
+
+
+def read_session(path):
+    """ Read the session record for the data file at path
+
+    @param str path: The path of the data file
+    @rtype: dict
+    """
+    with open(session_path(path)) as session_file:
+        return json.load(session_file)
+
+
+def recover(path):
+    """ Recover the data of a session that crashed while writing to path. The last row is dropped if it was
+    only partly written. The recovered data is moved to {name}.recovered{n}.csv (and its session file to
+    {name}.recovered{n}.session.json) so it is not overwritten.
+
+    @param str path: The path the crashed session would have saved to
+    @return: The path of the recovered file, or None if there was nothing to recover
+    @rtype: str|None
+    """
+    partial_path = path + PARTIAL_SUFFIX
+    if not os.path.exists(partial_path):
+        return None
+
+    with open(partial_path, newline='') as partial:
+        content = partial.read()
+
+    # A row that was cut off in the middle doesn't end with a newline
+    if content != '' and not content.endswith('\n'):
+        rows = list(csv.reader(io.StringIO(content)))[:-1]
+        with open(partial_path, 'w', newline='') as partial:
+            csv.writer(partial, lineterminator='\n').writerows(rows)
+
+    name = os.path.splitext(path)[0]
+    n = 1
+    while os.path.exists("{0}.recovered{1}.csv".format(name, n)):
+        n += 1
+    recovered_path = "{0}.recovered{1}.csv".format(name, n)
+
+    os.replace(partial_path, recovered_path)
+    if os.path.exists(session_path(partial_path)):
+        os.replace(session_path(partial_path), session_path(recovered_path))
+    return recovered_path
+
+
+def export_wide(path, output_path):
+    """ Export the data file at path in the wide format, where every row also has all the configuration's
+    variables (and no session id), like the data files of older versions of the experiment.
+
+    @param str path: The path of the data file
+    @param str output_path: Where to write the wide data file
+    @rtype: None
+    """
+    session = read_session(path)
+    config_columns = list(session['config'])
+    config_values = [session['config'][column] for column in config_columns]
+
+    with open(path, newline='') as data_file, open(output_path, 'w', newline='') as output_file:
+        reader = csv.reader(data_file)
+        writer = csv.writer(output_file, lineterminator='\n')
+
+        columns = next(reader, None)
+        if columns is None:
+            return
+        # Every row starts with the session id
+        writer.writerow(columns[1:] + config_columns)
+        for row in reader:
+            writer.writerow(row[1:] + config_values)
+
+
+def _numpy_column(values):
+    """ Convert a column to a numpy array. Numeric arrays keep their type, other columns are saved as text.
+
+    @param array|list|numpy.ndarray values:
+    @rtype: numpy.ndarray
+    """
+    import numpy
+
+    if isinstance(values, list):
+        return numpy.array(['' if value is None else str(value) for value in values])
+    if isinstance(values, numpy.ndarray):
+        return values
+    return numpy.frombuffer(values, dtype=values.typecode) if len(values) != 0 else numpy.array(values)
+
+
+def _arrow_table(columns):
+    """ Convert columns to a pyarrow Table
+
+    @param dict[str, array|list|numpy.ndarray] columns:
+    @rtype: pyarrow.Table
+    """
+    import pyarrow
+
+    return pyarrow.table({name: pyarrow.array(values if hasattr(values, 'dtype') else list(values))
+                          for name, values in columns.items()})
+
+
+def save_npz(path, columns):
+    """ Save columns to a compressed numpy .npz file. Each column can be loaded on its own.
+
+    @param str path:
+    @param dict[str, array|list] columns:
+    @rtype: None
+    """
+    import numpy
+
+    numpy.savez_compressed(path, **{name: _numpy_column(values) for name, values in columns.items()})
+
+
+def save_feather(path, columns):
+    """ Save columns to an uncompressed Feather (Arrow IPC) file, which can be memory-mapped
+
+    @param str path:
+    @param dict[str, array|list] columns:
+    @rtype: None
+    """
+    from pyarrow import feather
+
+    feather.write_feather(_arrow_table(columns), path, compression='uncompressed')
+
+
+def save_parquet(path, columns):
+    """ Save columns to a zstd compressed Parquet file
+
+    @param str path:
+    @param dict[str, array|list] columns:
+    @rtype: None
+    """
+    from pyarrow import parquet
+
+    parquet.write_table(_arrow_table(columns), path, compression='zstd')
+
+
+# The formats data can be saved in (along with csv), with their file extension and how to save them
+BACKENDS = {'npz': ('.npz', save_npz),
+            'feather': ('.feather', save_feather),
+            'parquet': ('.parquet', save_parquet)}
+
+# The modules each format needs, which might not be installed
+REQUIREMENTS = {'npz': ['numpy'],
+                'feather': ['pyarrow.feather'],
+                'parquet': ['pyarrow.parquet']}
+
+
+def check_formats(formats):
+    """ Make sure data can be saved in all the given formats: that they are known, and that the modules they need
+    are installed, so we don't find out when the first section is saved
+
+    @param list[str] formats:
+    @rtype: None
+    """
+    for output_format in formats:
+        if output_format != 'csv' and output_format not in BACKENDS:
+            raise ValueError("Unknown output format '{}', use one of: csv, {}".format(output_format,
+                                                                                     ", ".join(BACKENDS)))
+        for module in REQUIREMENTS.get(output_format, []):
+            importlib.import_module(module)
+
+
+def save_columns(path, columns, formats):
+    """ Save the columns next to the data file at path, in each of the given formats.
+    The csv format is skipped, as the data file is already a csv.
+
+    @param str path: The path of the data file
+    @param dict[str, array|list] columns:
+    @param list[str] formats:
+    @rtype: None
+    """
+    for output_format in formats:
+        if output_format == 'csv':
+            continue
+        extension, save = BACKENDS[output_format]
+        save(os.path.splitext(path)[0] + extension, columns)
+
+
+def read_columns(path, columns=None):
+    """ Read some (or all) columns of a data file saved in any of the formats, without parsing the rest.
+    Feather files are memory-mapped.
+
+    @param str path: The path of a .csv, .npz, .feather or .parquet file
+    @param list[str]|None columns: The names of the columns to read, or None for all of them
+    @return: The columns, by name. Columns of csv files are lists of str
+    @rtype: dict
+    """
+    extension = os.path.splitext(path)[1]
+
+    if extension == '.npz':
+        import numpy
+        with numpy.load(path) as data:
+            return {name: data[name] for name in (data.files if columns is None else columns)}
+
+    if extension == '.feather':
+        from pyarrow import feather
+        table = feather.read_table(path, columns=columns, memory_map=True)
+        return {name: table.column(name).to_numpy() for name in table.column_names}
+
+    if extension == '.parquet':
+        from pyarrow import parquet
+        table = parquet.read_table(path, columns=columns)
+        return {name: table.column(name).to_numpy() for name in table.column_names}
+
+    with open(path, newline='') as data_file:
+        reader = csv.reader(data_file)
+        names = next(reader, [])
+        rows = list(reader)
+    # Rows that are cut short (like the last row of a crashed session) are missing their last values
+    return {name: [row[i] if i < len(row) else '' for row in rows]
+            for i, name in enumerate(names) if columns is None or name in columns}
+
+
+def main():
+    """ Export data files in the wide format from the command line"""
+    parser = argparse.ArgumentParser(description="Export data files in the wide format, where every row also has "
+                                                 "all the configuration's variables.")
+    parser.add_argument('paths', nargs='+', help="The data files to export, like data/task/1.csv")
+    parser.add_argument('--suffix', default='.wide.csv',
+                        help="Written next to each data file, replacing .csv (default: .wide.csv)")
+    args = parser.parse_args()
+
+    for path in args.paths:
+        export_wide(path, os.path.splitext(path)[0] + args.suffix)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,67 +1,68 @@
 """ A package with the code for the main task"""
 
-from psychopy import core
-import random
+import records
+import schedule
+import timing
+
+# The font sizes (in pt) of the stimulus and the legend beneath it. Experiment with size here!
+STIMULUS_FONT_SIZE = 24
+LEGEND_FONT_SIZE = 24
+
+
+def stimulus_text(character, flanker):
+    """ The text shown for a trial with the given character and flanker
+
+    @param str character:
+    @param str flanker:
+    @rtype: str
+    """
+    return '{1} {0} {1}'.format(character, flanker)
+
+
+def legend_text(config):
+    """ The legend shown beneath every stimulus, reminding participants which key is which
+
+    @param config.Configuration config:
+    @rtype: str
+    """
+    return '{0} for  letters, {1} for numbers'.format(config.letter_key, config.number_key)
 
 
 class Trial:
     """ A trial in the main task"""
 
-    class DataPoint:
+    class DataPoint(records.Record):
         """ A DataPoint for a trial"""
+        FIELDS = (('char', str), ('flanker', str), ('user_input', str), ('response_time', float),
+                  ('flip_latency', float), ('draw_duration', float), ('correct', bool), ('type', str),
+                  ('right_key', str), ('wrong_key', str), ('helpful', int), ('dropped_frames', int),
+                  ('worst_frame_interval', float), ('overrun', float))
+        __slots__ = records.slots(FIELDS)
 
-        def __init__(self, character, flanker, block):
-            """ Creates a DataPoint for a trial in a block
+        def __init__(self, trial, block):
+            """ Creates a DataPoint for a trial in a block. The type, keys and helpfulness of the trial come from the
+            schedule, so what is saved is what verify_schedule.py checks
 
-            @param str character:
-            @param str flanker:
+            @param schedule.ScheduledTrial trial:
             @param Block block:
             """
-            # Get the character and flanker for this trial
-            self.char = character
-            self.flanker = flanker
+            super().__init__(block.to_save)
 
-            self.user_input = None
-            self.response_time = None
-            self.correct = None
-
-            self.__parent = block.to_save
-
-            # Get the type of the trial
-            if character in '23456789':
-                self.type = 'numeric'
-            elif character.isalpha():
-                self.type = 'alphabetic'
-            else:
-                raise Exception("Character '{}' is not in the allowed set of characters".format(character))
+            self.char = trial.char
+            self.flanker = trial.flanker
+            self.type = trial.type
+            self.helpful = trial.helpful
 
-            # Get the correct keys for this trial:
-            if self.type == 'alphabetic':
-                self.right_key = block.config.letter_key
+            self.right_key = trial.right_key
+            if self.right_key == block.config.letter_key:
                 self.wrong_key = block.config.number_key
             else:
-                self.right_key = block.config.number_key
                 self.wrong_key = block.config.letter_key
 
-            # Get whether this trial's flanker is helpful or not
-            if flanker == '#':
-                self.helpful = 0
-            elif flanker == '@':
-                if self.type == 'alphabetic':
-                    self.helpful = 1 if block.config.letters_corr_at else -1
-                else:
-                    self.helpful = -1 if block.config.letters_corr_at else 1
-            elif self.flanker == '*':
-                if self.type == 'alphabetic':
-                    self.helpful = -1 if block.config.letters_corr_at else 1
-                else:
-                    self.helpful = 1 if block.config.letters_corr_at else -1
-
-    def __init__(self, character, flanker, block):
+    def __init__(self, trial, block):
         """ Initializes the Trial class
 
-        @param str character:
-        @param str flanker:
+        @param schedule.ScheduledTrial trial:
         @param Block block:
         """
 
@@ -69,41 +70,54 @@ class Trial:
         self.window = block.window
         self.config = block.config
 
-        self.to_save = self.DataPoint(character, flanker, block)
+        self.to_save = self.DataPoint(trial, block)
 
     def feedback(self):
-        """ Give the user feedback on whether they got the answer right or wrong"""
+        """ Give the user feedback on whether they got the answer right or wrong
+
+        @return: How late the feedback ended, in s
+        @rtype: float
+        """
         # Show feed-back
         if self.to_save.correct:
-            self.window.show_image("images\\task\\feedback\\correct.png")
+            self.window.show_image(self.window.assets.image('task', 'feedback', 'correct'))
         else:
-            self.window.show_image("images\\task\\feedback\\incorrect.png")
-        # Wait a little bit
-        core.wait(self.config.task_feed_back_display_time)
+            self.window.show_image(self.window.assets.image('task', 'feedback', 'incorrect'))
+        # Wait a little bit, checking that no frames are dropped
+        return self.window.hold(self.config.task_feedback_frames)
 
     def run(self):
         """ Run this trial"""
-        timer = core.Clock()
-
-        text = '{1} {0} {1}'.format(self.to_save.char, self.to_save.flanker)
+        text = stimulus_text(self.to_save.char, self.to_save.flanker)
+        frames = self.window.frame_intervals.mark()
 
-        legend = '{0} for  letters, {1} for numbers'.format(self.config.letter_key, self.config.number_key)
-
-        # Experiment with size here!
-        self.window.show_text(text=text, font_size=24,
-                              legend=legend, legend_font_size=24)
+        profiler = self.experiment.profiler
+        with profiler.span('trial.show'):
+            timing = self.window.show_text(text=text, font_size=STIMULUS_FONT_SIZE,
+                                           legend=legend_text(self.config), legend_font_size=LEGEND_FONT_SIZE)
+        self.to_save.flip_latency = timing.flip_latency
+        self.to_save.draw_duration = timing.draw_duration
 
         # Don't record responses for the first few milliseconds
-        if self.config.task_no_keyboard_response_time >= 0:
-            core.wait(self.config.task_no_keyboard_response_time)
+        with profiler.span('trial.grace'):
+            self.to_save.overrun = self.window.hold(self.config.task_no_keyboard_response_frames,
+                                                    wait_for_end=True)
 
         # Get the user's response
-        self.to_save.user_input = self.window.wait_for_prompt(keys=[self.to_save.right_key, self.to_save.wrong_key])
-        self.to_save.response_time = timer.getTime()
+        with profiler.span('trial.input'):
+            key_press = self.window.wait_for_prompt(keys=[self.to_save.right_key, self.to_save.wrong_key],
+                                                    timestamped=True)
+        self.to_save.user_input = key_press.name
+        # Measured from when the stimulus actually appeared on the screen
+        self.to_save.response_time = key_press.time - timing.onset
         self.to_save.correct = (self.to_save.user_input == self.to_save.right_key)
 
         # Give the user some feedback
-        self.feedback()
+        with profiler.span('trial.feedback'):
+            self.to_save.overrun += self.feedback()
+
+        # Frames dropped while the stimulus and the feedback were held on the screen
+        self.to_save.dropped_frames, self.to_save.worst_frame_interval = self.window.frame_intervals.since(frames)
 
 
 class Block:
@@ -112,22 +126,22 @@ class Block:
     The number of flankers per block will vary.
     """
 
-    class DataPoint:
+    class DataPoint(records.Record):
         """ A DataPoint for a Block"""
+        FIELDS = (('block_num', int), ('trial_num', int), ('total_trial_num', int))
+        __slots__ = records.slots(FIELDS)
 
         def __init__(self, block_num, config):
             """ Create a DataPoint for a block"""
+            super().__init__(config)
             self.block_num = block_num
-            self.trial_num = None
-            self.total_trial_num = None
-            self.__parent = config
 
-    def __init__(self, experiment, type_flanker_amounts, block_num, save):
+    def __init__(self, experiment, trials, block_num, save):
 
         """ Initializes the block class
 
         @param experiment.Experiment experiment:
-        @param dict[str, dict[str, list[int]] type_flanker_amounts:
+        @param list[schedule.ScheduledTrial] trials: The trials of the block, in the order they are shown
         @param int block_num:
         """
         self.experiment = experiment
@@ -136,48 +150,62 @@ class Block:
 
         self.save = save
 
-        self.to_save = self.DataPoint(block_num, self.config)
-
-        # The numbers and letters to be included
-        nums = '23456789'
-        letters = 'ABCDEFGH'
-
-        # All characters to be used in this block
-        nums = list(nums * 4)
-        letters = list(letters * 4)
-
-        # Shuffle both lists
-        random.shuffle(nums)
-        random.shuffle(letters)
-
-        # Get iterators for both lists
-        num_gen = iter(nums)
-        letter_gen = iter(letters)
-
-        # Make a list to store the trials for the block
-        self.trials = []
-
-        # Populate the list with trials
-        for flanker in type_flanker_amounts['alphabetic']:
-            for _ in range(type_flanker_amounts['alphabetic'][flanker]):
-                self.trials.append(Trial(next(letter_gen), flanker, self))
+        with experiment.profiler.span('block.init'):
+            self.to_save = self.DataPoint(block_num, self.config)
 
-            for _ in range(type_flanker_amounts['numeric'][flanker]):
-                self.trials.append(Trial(next(num_gen), flanker, self))
-
-        # Randomize the trial presentation
-        random.shuffle(self.trials)
+            # Make the trials of the block, as given by the schedule
+            self.trials = [Trial(trial, self) for trial in trials]
 
     def run(self):
-        """ Run this block"""
+        """ Run this block, in the performance mode if it's enabled"""
+        with self.experiment.realtime.block():
+            self._run_trials()
+
+    def _run_trials(self):
+        """ Run the trials of this block"""
         for self.to_save.trial_num in range(len(self.trials)):
             self.to_save.total_trial_num = (self.to_save.block_num * len(self.trials)) + self.to_save.trial_num
             trial = self.trials[self.to_save.trial_num]
             trial.run()
+
+            # The interstimulus interval continues the feedback's hold, so it's timed from the feedback's onset
+            with self.experiment.profiler.span('trial.interstimulus'):
+                trial.to_save.overrun += self.window.hold(self.config.task_interstimulus_frames)
             if self.save:
                 self.experiment.push_data(trial.to_save)
-            if self.config.task_interstimulus_interval >= 0:
-                core.wait(self.config.task_interstimulus_interval)
+
+            # Only updates the progress in memory, it's sent in the background
+            self.experiment.telemetry.trial(self.to_save.block_num, self.to_save.trial_num, len(self.trials),
+                                            trial.to_save.response_time, trial.to_save.correct,
+                                            trial.to_save.dropped_frames)
+
+
+def check_assets(experiment):
+    """ Make sure all the images this task shows exist, so we don't find out mid-session
+
+    @param experiment.Experiment experiment:
+    @rtype: None
+    """
+    assets = experiment.window.assets
+    assets.require([('task', 'instructions', 'start_{}_letter'.format(experiment.config.letter_key)),
+                    ('task', 'instructions', 'practice'),
+                    ('task', 'instructions', 'task'),
+                    ('task', 'instructions', 'break')])
+    assets.image('task', 'feedback', 'correct')
+    assets.image('task', 'feedback', 'incorrect')
+
+
+def prepare(experiment):
+    """ Build every stimulus the task could show, so trials only have to draw them
+
+    @param experiment.Experiment experiment:
+    @rtype: None
+    """
+    experiment.window.prepare_text([stimulus_text(character, flanker)
+                                    for character in schedule.NUMBERS + schedule.LETTERS
+                                    for flanker in list(schedule.FLANKERS) + [schedule.PRACTICE_FLANKER]],
+                                   font_size=STIMULUS_FONT_SIZE,
+                                   legend=legend_text(experiment.config), legend_font_size=LEGEND_FONT_SIZE)
 
 
 def run(experiment):
@@ -190,44 +218,35 @@ def run(experiment):
     # Start a new section of the experiment we are in
     experiment.new_section('task')
 
+    # The durations of the trials are counted in frames of the display. They are saved with the config
+    config = experiment.config
+    config.task_frame_duration = experiment.window.frame_intervals.frame_duration
+    config.task_no_keyboard_response_frames = timing.frames(config.task_no_keyboard_response_time,
+                                                            config.task_frame_duration)
+    config.task_feedback_frames = timing.frames(config.task_feed_back_display_time, config.task_frame_duration)
+    config.task_interstimulus_frames = timing.frames(config.task_interstimulus_interval, config.task_frame_duration)
+
+    # Build every stimulus we could show up front (if it wasn't already), so trials only have to draw them
+    prepare(experiment)
+
     # Show some instructions
     experiment.window.show_image_sequence('instructions', 'start_{}_letter'.format(experiment.config.letter_key))
 
+    # The characters and flankers of every trial of the session, counterbalanced for the participant's condition
+    session = schedule.session_schedule(experiment.config, experiment.config.seed)
+
     # Show a practice block
     if experiment.config.practice_run:
         experiment.window.show_image_sequence('instructions', 'practice')
-        practice_trial_amounts = {'alphabetic': {'$': 5}, 'numeric': {'$': 5}}
-        Block(experiment, practice_trial_amounts, -1, save=False).run()
-
-    # How many trials for each type of character and each type of flanker
-    trial_amounts = {'alphabetic': {'#': [8] * 6}, 'numeric': {'#': [8] * 6}}
-
-    # Assume that experiment.letters_corr_at is True
-    # Note we know that for each character the trial amounts add up to 32
-    trial_amounts['alphabetic']['@'] = [21] * 4 + [22] * 2
-    random.shuffle(trial_amounts['alphabetic']['@'])
-    trial_amounts['alphabetic']['*'] = [24 - i for i in trial_amounts['alphabetic']['@']]
-
-    trial_amounts['numeric']['*'] = [21] * 4 + [22] * 2
-    random.shuffle(trial_amounts['numeric']['*'])
-    trial_amounts['numeric']['@'] = [24 - i for i in trial_amounts['numeric']['*']]
-
-    # But if experiment.letters_corr_at is False, switch the occurrences
-    if not experiment.config.letters_corr_at:
-        trial_amounts['alphabetic'], trial_amounts['numeric'] = trial_amounts['numeric'], trial_amounts['alphabetic']
+        Block(experiment, schedule.block_trials(session, -1), -1, save=False).run()
 
     experiment.window.show_image_sequence('instructions', 'task')
-    for block_num in range(6):
-        # Take only the i'th value of the trial_amounts amounts
-        type_flanker_amounts = {char_type: {flanker_type: trial_amounts[char_type][flanker_type][block_num]
-                                            for flanker_type in trial_amounts[char_type]}
-                                for char_type in trial_amounts}
-
-        # Run the block that is represented by the trial amounts
-        Block(experiment, type_flanker_amounts, block_num, save=True).run()
+    for block_num in range(schedule.BLOCKS):
+        # Run the block with this block's trials from the schedule
+        Block(experiment, schedule.block_trials(session, block_num), block_num, save=True).run()
 
         # Give them a break before the next block, unless it's the last block
-        if block_num < 5:
+        if block_num < schedule.BLOCKS - 1:
             experiment.window.show_image_sequence('instructions', 'break')
 
     experiment.save_data()
@@ -0,0 +1,281 @@
+""" Live progress of sessions, so the sessions of many stations can be watched from one computer.
+
+While a session runs, a snapshot of its progress (the section, block and trial, the response time and accuracy of the
+recent trials, the frames dropped and when the data was last saved) is sent as a small json message over UDP, from a
+background thread, about once a second. The trials only update the snapshot in memory, and nothing is ever waited for
+or sent back, so a missing or slow collector can't hold up a session. Turned on with telemetry in config.py.
+
+Can also be run to collect the messages of every station and show them in one table, refreshed every second:
+
+    python telemetry.py --port 47800
+
+A station that stopped sending (because it crashed or froze) is shown as stale.
+"""
+
+import argparse
+import collections
+import json
+import os
+import socket
+import threading
+import time
+
+
+# The port messages are sent to and collected on, unless configured otherwise
+PORT = 47800
+
+# How many of the most recent trials the response time and accuracy are averaged over
+RECENT_TRIALS = 20
+
+# The largest message that is read. Messages are a few hundred bytes
+MAX_MESSAGE_SIZE = 65507
+
+
+class Publisher:
+    """ Keeps a snapshot of the progress of a session, and sends it to the collector every interval"""
+
+    def __init__(self, enabled=False, address=('127.0.0.1', PORT), interval=1.0, station=None, participant=None,
+                 session_id=None):
+        """ Starts sending, if enabled
+
+        @param bool enabled: Whether to send anything
+        @param (str, int) address: Where to send the messages: the host running the collector (or a broadcast address
+            like '255.255.255.255' for every computer on the network) and its port
+        @param float interval: How often to send a message, in s
+        @param str|None station: The name of this station. Defaults to the name of the computer
+        @param str|None participant:
+        @param str|None session_id:
+        """
+        self.enabled = enabled
+        self.address = address
+        self.interval = interval
+
+        # How many messages couldn't be sent
+        self.failed = 0
+
+        self._state = {'station': station if station is not None else socket.gethostname(), 'pid': os.getpid(),
+                       'participant': participant, 'session_id': session_id, 'status': 'running', 'section': None,
+                       'block': None, 'trial': None, 'trials': None, 'dropped_frames': 0, 'last_save': None}
+        self._response_times = collections.deque(maxlen=RECENT_TRIALS)
+        self._correct = collections.deque(maxlen=RECENT_TRIALS)
+        self._sequence = 0
+
+        # Only held to copy or change the snapshot, never while sending
+        self._lock = threading.Lock()
+
+        self._socket = None
+        self._stop = threading.Event()
+        self._thread = None
+        if enabled:
+            self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+            self._socket.setblocking(False)
+
+            self._thread = threading.Thread(target=self._run, name="telemetry", daemon=True)
+            self._thread.start()
+
+    def section(self, name):
+        """ A new section of the session started
+
+        @param str name:
+        @rtype: None
+        """
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self._state.update(section=name, block=None, trial=None, trials=None)
+            self._response_times.clear()
+            self._correct.clear()
+
+    def trial(self, block, trial, trials, response_time, correct, dropped_frames):
+        """ A trial of a block was done
+
+        @param int block: The number of the block, -1 for the practice block
+        @param int trial: The number of the trial in the block, from 0
+        @param int trials: How many trials the block has
+        @param float response_time: In s
+        @param bool correct:
+        @param int dropped_frames: How many frames were dropped during the trial
+        @rtype: None
+        """
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self._state.update(block=block, trial=trial, trials=trials)
+            self._state['dropped_frames'] += dropped_frames
+            self._response_times.append(response_time)
+            self._correct.append(correct)
+
+    def saved(self):
+        """ The data was just saved"""
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self._state['last_save'] = time.time()
+
+    def message(self):
+        """ The snapshot of the session right now, as sent to the collector
+
+        @rtype: dict
+        """
+        with self._lock:
+            message = dict(self._state)
+            response_times = list(self._response_times)
+            correct = list(self._correct)
+            self._sequence += 1
+            message['sequence'] = self._sequence
+
+        message['recent_trials'] = len(correct)
+        message['response_time'] = sum(response_times) / len(response_times) if len(response_times) > 0 else None
+        message['accuracy'] = sum(correct) / float(len(correct)) if len(correct) > 0 else None
+        message['sent'] = time.time()
+        return message
+
+    def _send(self):
+        """ Send the snapshot, without waiting. If it can't be sent right away it's skipped, the next one will do"""
+        try:
+            self._socket.sendto(json.dumps(self.message()).encode('utf-8'), self.address)
+        except OSError:
+            self.failed += 1
+
+    def _run(self):
+        """ Send the snapshot every interval, until closed"""
+        while not self._stop.wait(self.interval):
+            self._send()
+
+    def close(self, status='finished'):
+        """ Send the final snapshot and stop sending
+
+        @param str status: How the session ended
+        @rtype: None
+        """
+        if not self.enabled or self._stop.is_set():
+            return
+
+        self._stop.set()
+        self._thread.join()
+        with self._lock:
+            self._state['status'] = status
+        self._send()
+        self._socket.close()
+
+
+class Collector:
+    """ Receives the messages of every station, and keeps the latest one of each"""
+
+    def __init__(self, port=PORT, host='', stale=5.0):
+        """ Starts listening
+
+        @param int port:
+        @param str host: The address to listen on, '' for all of them
+        @param float stale: A station is stale if it didn't send anything for this long, in s
+        """
+        self.stale = stale
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind((host, port))
+
+        # The latest message of each station, with when it was received and where from
+        self.stations = {}
+
+    def receive(self, timeout):
+        """ Receive the messages that arrive within timeout
+
+        @param float timeout: In s
+        @return: How many messages were received
+        @rtype: int
+        """
+        received = 0
+        deadline = time.time() + timeout
+        while True:
+            self._socket.settimeout(max(0.0, deadline - time.time()))
+            try:
+                data, sender = self._socket.recvfrom(MAX_MESSAGE_SIZE)
+            except socket.timeout:
+                return received
+
+            try:
+                message = json.loads(data.decode('utf-8'))
+                station = message['station']
+            except (ValueError, KeyError, TypeError):
+                continue
+
+            # Messages can arrive out of order, only keep the newest of a session
+            latest = self.stations.get(station)
+            if (latest is not None and latest['session_id'] == message.get('session_id')
+                    and latest['sequence'] >= message.get('sequence', 0)):
+                continue
+
+            message['received'] = time.time()
+            message['address'] = sender[0]
+            self.stations[station] = message
+            received += 1
+
+    def status(self, station):
+        """ The status of a station: the status it sent, or 'stale' if it stopped sending while running
+
+        @param str station:
+        @rtype: str
+        """
+        message = self.stations[station]
+        if message['status'] == 'running' and time.time() - message['received'] > self.stale:
+            return 'stale'
+        return message['status']
+
+    def table(self):
+        """ The latest message of every station as a table, one station per line
+
+        @rtype: str
+        """
+        lines = ["{0:<16} {1:<12} {2:<9} {3:<10} {4:>8} {5:>9} {6:>8} {7:>8} {8:>10} {9:>8}".format(
+            'station', 'participant', 'status', 'section', 'block', 'trial', 'rt (ms)', 'accuracy', 'dropped',
+            'saved')]
+        now = time.time()
+        for station in sorted(self.stations):
+            message = self.stations[station]
+            block = '' if message['block'] is None else 'practice' if message['block'] < 0 else message['block'] + 1
+            trial = '' if message['trial'] is None else "{0}/{1}".format(message['trial'] + 1, message['trials'])
+            response_time = '' if message['response_time'] is None else "{0:.0f}".format(
+                message['response_time'] * 1000)
+            accuracy = '' if message['accuracy'] is None else "{0:.0%}".format(message['accuracy'])
+            saved = '' if message['last_save'] is None else "{0:.0f}s ago".format(now - message['last_save'])
+            lines.append("{0:<16} {1:<12} {2:<9} {3:<10} {4:>8} {5:>9} {6:>8} {7:>8} {8:>10} {9:>8}".format(
+                station[:16], str(message['participant'])[:12], self.status(station), str(message['section'])[:10],
+                block, trial, response_time, accuracy, message['dropped_frames'], saved))
+        return '\n'.join(lines)
+
+    def close(self):
+        """ Stop listening"""
+        self._socket.close()
+
+
+def main():
+    """ Collect and show the progress of every station from the command line"""
+    parser = argparse.ArgumentParser(description="Show the progress of the sessions of every station.")
+    parser.add_argument('--port', type=int, default=PORT, help="The port to listen on (default: {})".format(PORT))
+    parser.add_argument('--host', default='', help="The address to listen on (default: all of them)")
+    parser.add_argument('--stale', type=float, default=5.0,
+                        help="Seconds without a message before a station is shown as stale (default: 5)")
+    parser.add_argument('--once', action='store_true', help="Listen for one refresh, print the table and stop")
+    args = parser.parse_args()
+
+    collector = Collector(args.port, args.host, args.stale)
+    try:
+        while True:
+            collector.receive(1.0)
+            if args.once:
+                print(collector.table())
+                return
+            # Clear the terminal and show the table at the top
+            print("\033[H\033[J" + collector.table(), flush=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        collector.close()
+
+
+if __name__ == '__main__':
+    main()
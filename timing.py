@@ -0,0 +1,196 @@
+""" Records of when things happened, shared by the real and the headless windows"""
+
+from collections import namedtuple
+
+
+def frames(seconds, frame_duration):
+    """ The number of whole frames closest to the given duration
+
+    @param float seconds:
+    @param float frame_duration: In s
+    @rtype: int
+    """
+    return max(0, int(round(seconds / frame_duration)))
+
+
+# A single key press, with the time (in core.getTime() seconds) it actually happened
+KeyPress = namedtuple('KeyPress', ['name', 'time'])
+
+
+# A single click of the mouse, at (x, y) in px from the center of the window, with the time it happened
+Click = namedtuple('Click', ['x', 'y', 'time'])
+
+
+class Choice(namedtuple('Choice', ['name', 'onset', 'time'])):
+    """ A choice made on a multiple choice screen, with when the screen appeared and when the choice was made.
+    Times are in core.getTime() seconds.
+    """
+
+    @property
+    def latency(self):
+        """ The time it took to choose, from when the choices appeared, in s"""
+        return self.time - self.onset
+
+
+# A single keystroke while typing text: the text it typed, or '' and the name of the key it was if it didn't type
+# anything (like 'backspace'), with the time it happened
+Keystroke = namedtuple('Keystroke', ['text', 'key', 'time'])
+
+
+class TypedText(namedtuple('TypedText', ['text', 'onset', 'keystrokes'])):
+    """ Text typed on a text entry screen, with when the screen appeared and every keystroke (Keystroke) that was
+    typed on it, including the one that submitted it. Times are in core.getTime() seconds.
+    """
+
+    @classmethod
+    def evenly(cls, text, onset, end, submit_key='0'):
+        """ The text, as if it was typed at an even pace from onset and submitted at end.
+        Used for answers that weren't typed (like a simulated participant's).
+
+        @param str text:
+        @param float onset: In s
+        @param float end: In s
+        @param str submit_key: What submitted the text
+        @rtype: TypedText
+        """
+        step = (end - onset) / (len(text) + 1)
+        keystrokes = [Keystroke(character, '', onset + (i + 1) * step) for i, character in enumerate(text)]
+        return cls(text, onset, keystrokes + [Keystroke(submit_key, '', end)])
+
+    @property
+    def keystroke_names(self):
+        """ What each keystroke typed, or the name of its key if it didn't type anything
+
+        @rtype: list[str]
+        """
+        return [keystroke.text if keystroke.text != '' else keystroke.key for keystroke in self.keystrokes]
+
+    @property
+    def keystroke_times(self):
+        """ When each keystroke happened, from when the screen appeared, in s
+
+        @rtype: list[float]
+        """
+        return [keystroke.time - self.onset for keystroke in self.keystrokes]
+
+
+class StimulusTiming(namedtuple('StimulusTiming', ['request_time', 'drawn_time', 'onset'])):
+    """ When a stimulus was asked to be shown, when it was done being drawn,
+    and when the flip that showed it happened. All times are in core.getTime() seconds.
+    """
+
+    @property
+    def draw_duration(self):
+        """ The time it took to build and draw the stimulus, in s"""
+        return self.drawn_time - self.request_time
+
+    @property
+    def flip_latency(self):
+        """ The time between asking for the stimulus and it appearing on the screen, in s"""
+        return self.onset - self.request_time
+
+
+class FrameIntervals:
+    """ The intervals between consecutive flips of a window, while it is flipped every frame.
+    Only flips that follow each other without a pause (like while holding a stimulus on the screen) are measured,
+    since the window isn't flipped while waiting for a response.
+    """
+
+    def __init__(self, frame_duration, threshold=1.5):
+        """ Starts recording
+
+        @param float frame_duration: The duration of a frame of the display, in s
+        @param float threshold: An interval longer than this many frames means frames were dropped
+        """
+        self.frame_duration = frame_duration
+        self.threshold = threshold
+        self.intervals = []
+        self._last_flip = None
+
+        # How late each hold that ran late ended, in s
+        self.overruns = []
+
+    def flip(self, flip_time):
+        """ Record a flip of the window
+
+        @param float flip_time: When the flip happened, in s
+        @rtype: None
+        """
+        if self._last_flip is not None:
+            self.intervals.append(flip_time - self._last_flip)
+        self._last_flip = flip_time
+
+    def pause(self):
+        """ The window stops being flipped every frame, so the time until the next flip is not a frame interval"""
+        self._last_flip = None
+
+    def overran(self, overrun):
+        """ Record that a hold ended late
+
+        @param float overrun: How late it ended, in s
+        @rtype: None
+        """
+        self.overruns.append(overrun)
+
+    def mark(self):
+        """ A mark of the intervals and overruns recorded so far, to only look at those that come after it
+
+        @rtype: (int, int)
+        """
+        return len(self.intervals), len(self.overruns)
+
+    def dropped(self, interval):
+        """ How many frames were dropped in an interval
+
+        @param float interval: In s
+        @rtype: int
+        """
+        if interval <= self.threshold * self.frame_duration:
+            return 0
+        return int(round(interval / self.frame_duration)) - 1
+
+    def since(self, mark):
+        """ The number of frames dropped since mark, and the worst interval (or None if there wasn't any)
+
+        @param (int, int) mark: From mark()
+        @rtype: (int, float|None)
+        """
+        intervals = self.intervals[mark[0]:]
+        if len(intervals) == 0:
+            return 0, None
+        return sum(self.dropped(interval) for interval in intervals), max(intervals)
+
+    def summary(self, mark=(0, 0), max_dropped_fraction=0.01):
+        """ A summary of all the intervals since mark: their percentiles (in ms), how many frames were dropped,
+        a histogram of how many frames each interval lasted (1, 2, 3, 4 or more) and how many holds ended late.
+        The summary is flagged if more than max_dropped_fraction of the frames were dropped.
+
+        @param (int, int) mark: From mark()
+        @param float max_dropped_fraction:
+        @rtype: dict
+        """
+        import numpy
+
+        intervals = numpy.array(self.intervals[mark[0]:])
+        overruns = self.overruns[mark[1]:]
+        dropped = sum(self.dropped(interval) for interval in intervals)
+        total = len(intervals) + dropped
+        summary = {'frame_duration_ms': self.frame_duration * 1000,
+                   'intervals': len(intervals),
+                   'dropped_frames': dropped,
+                   'dropped_fraction': dropped / total if total > 0 else 0.0,
+                   'flagged': total > 0 and dropped / total > max_dropped_fraction,
+                   'overruns': len(overruns),
+                   'overrun_max_ms': max(overruns) * 1000 if len(overruns) > 0 else 0.0}
+        if len(intervals) == 0:
+            return summary
+
+        for name, percentile in (('p50', 50), ('p90', 90), ('p99', 99), ('p99_9', 99.9)):
+            summary['interval_{}_ms'.format(name)] = float(numpy.percentile(intervals, percentile)) * 1000
+        summary['interval_mean_ms'] = float(intervals.mean()) * 1000
+        summary['interval_max_ms'] = float(intervals.max()) * 1000
+
+        frames_per_interval = numpy.clip(numpy.round(intervals / self.frame_duration).astype(int), 1, 4)
+        summary['histogram_frames'] = ['1', '2', '3', '4+']
+        summary['histogram'] = numpy.bincount(frames_per_interval - 1, minlength=4).tolist()
+        return summary
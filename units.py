@@ -0,0 +1,79 @@
+""" Conversions between the units of the window: norm (-1 to 1 across the window), px and cm.
+
+They are all linear, so they're worked out once from the window's size and the monitor's calibration, instead of
+asking the monitor for every point. Points can be a single (x, y) pair, or an array of pairs converted all at once.
+Doesn't need psychopy.
+"""
+
+
+class UnitConverter:
+    """ Converts points and lengths between norm, px and cm for a window"""
+
+    def __init__(self, window_size, cm_per_px):
+        """ Creates a converter for a window
+
+        @param (float, float) window_size: The size of the window, in px
+        @param float cm_per_px: The width of a pixel of the monitor, in cm
+        """
+        self.window_size = (float(window_size[0]), float(window_size[1]))
+        self.cm_per_px = float(cm_per_px)
+
+        # How much each axis is scaled by, for each conversion
+        self._px_to_cm = (self.cm_per_px, self.cm_per_px)
+        self._px_to_norm = (2.0 / self.window_size[0], 2.0 / self.window_size[1])
+        self._norm_to_cm = (self.window_size[0] / 2.0 * self.cm_per_px, self.window_size[1] / 2.0 * self.cm_per_px)
+
+    @classmethod
+    def from_window(cls, window):
+        """ Creates a converter from a psychopy window and its monitor's calibration, like
+        psychopy.tools.monitorunittools.pix2cm
+
+        @param psychopy.visual.Window window:
+        @rtype: UnitConverter
+        """
+        width_cm = window.monitor.getWidth()
+        width_px = window.monitor.getSizePix()
+        if width_cm is None or width_px is None:
+            raise ValueError("The monitor '{}' needs its width in cm and its size in px to convert to cm"
+                             .format(window.monitor.name))
+        return cls(window.size, float(width_cm) / width_px[0])
+
+    @staticmethod
+    def _scale(point, scale):
+        """ Scale a point, or an array of points, by scale on each axis
+
+        @param (float, float)|numpy.ndarray point: A point, or an array of shape (n, 2)
+        @param (float, float) scale:
+        @rtype: (float, float)|numpy.ndarray
+        """
+        if isinstance(point, (tuple, list)) and len(point) == 2 and not isinstance(point[0], (tuple, list)):
+            return point[0] * scale[0], point[1] * scale[1]
+
+        import numpy
+        return numpy.asarray(point, dtype=float) * scale
+
+    def norm_to_cm(self, point):
+        """ @rtype: (float, float)|numpy.ndarray"""
+        return self._scale(point, self._norm_to_cm)
+
+    def px_to_cm(self, point):
+        """ @rtype: (float, float)|numpy.ndarray"""
+        return self._scale(point, self._px_to_cm)
+
+    def px_to_norm(self, point):
+        """ @rtype: (float, float)|numpy.ndarray"""
+        return self._scale(point, self._px_to_norm)
+
+    def scalar_norm_to_cm(self, scalar):
+        """ Convert a horizontal length from norm to cm
+
+        @rtype: float
+        """
+        return scalar * self._norm_to_cm[0]
+
+    def scalar_px_to_cm(self, scalar):
+        """ Convert a length from px to cm
+
+        @rtype: float
+        """
+        return scalar * self.cm_per_px
@@ -0,0 +1,185 @@
+""" Checks the counterbalancing of the task's schedules over many simulated sessions.
+
+Generates sessions with the same code the task uses (schedule.generate), in batches spread over several processes,
+and counts how many sessions break each of the constraints described in the README. Also reports how often each
+number of flankers shows up per block. Run it like:
+
+    python verify_schedule.py --sessions 1000000 --seed 1
+"""
+
+import argparse
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy
+
+import schedule
+
+
+# The constraints checked, with a short description of each
+CONSTRAINTS = {
+    'block_types': "each block has 32 letters and 32 numbers",
+    'block_characters': "each character is shown 4 times per block",
+    'hash_flanker': "'#' is shown with 8 letters and 8 numbers per block",
+    'flanker_totals': "'@' and '*' are each shown 144 times in total",
+    'flanker_per_block': "'@' and '*' are each shown 23 to 25 times per block",
+    'flanker_24_blocks': "'@' and '*' are each shown exactly 24 times in at least 2 blocks",
+    'flanker_23_25_balance': "'@' and '*' are shown 23 (and 25) times in the same number of blocks",
+    'correlated_split': "the correlated type and flanker go together 21 times in 4 blocks and 22 times in 2",
+    'type': "type is alphabetic for letters and numeric for numbers",
+    'right_key': "letters and numbers each have their own key all session, as set by the condition",
+    'helpful': "helpful is 1 for the flanker shown most with the type over the session, -1 for the other and 0 "
+               "for '#'",
+    'practice': "the practice block has 5 letters and 5 numbers with the '$' flanker",
+}
+
+
+def check_batch(args):
+    """ Generate a batch of sessions and check them. Runs in a worker process.
+
+    @param (int, numpy.random.SeedSequence, int) args: The number of sessions, their seed and the first condition
+    @return: Violations per constraint, and the distributions
+    @rtype: (dict[str, int], dict[str, numpy.ndarray])
+    """
+    sessions, seed, first_condition = args
+    conditions = (numpy.arange(sessions) + first_condition) % 4
+    columns = schedule.generate(conditions, seed, task_key1='j', task_key2='f')
+    letters_corr_at = conditions % 2 == 0
+
+    practice = schedule.PRACTICE_TRIALS * 2
+    shape = (sessions, schedule.BLOCKS, schedule.TRIALS_PER_BLOCK)
+    chars = columns['char'][:, practice:].reshape(shape)
+    flankers = columns['flanker'][:, practice:].reshape(shape)
+    helpful = columns['helpful'][:, practice:].reshape(shape)
+    alphabetic = numpy.isin(chars, list(schedule.LETTERS))
+
+    at = flankers == '@'
+    star = flankers == '*'
+    at_per_block = at.sum(axis=-1)
+    star_per_block = star.sum(axis=-1)
+
+    violations = {}
+    violations['block_types'] = (alphabetic.sum(axis=-1) != 32).any(axis=-1)
+
+    char_counts = numpy.stack([(chars == c).sum(axis=-1) for c in schedule.LETTERS + schedule.NUMBERS], axis=-1)
+    violations['block_characters'] = (char_counts != schedule.REPEATS).any(axis=(1, 2))
+
+    hash_flanker = flankers == '#'
+    violations['hash_flanker'] = (((hash_flanker & alphabetic).sum(axis=-1) != 8) |
+                                  ((hash_flanker & ~alphabetic).sum(axis=-1) != 8)).any(axis=-1)
+
+    violations['flanker_totals'] = (at_per_block.sum(axis=-1) != 144) | (star_per_block.sum(axis=-1) != 144)
+    violations['flanker_per_block'] = ((at_per_block < 23) | (at_per_block > 25) |
+                                       (star_per_block < 23) | (star_per_block > 25)).any(axis=-1)
+    violations['flanker_24_blocks'] = (((at_per_block == 24).sum(axis=-1) < 2) |
+                                       ((star_per_block == 24).sum(axis=-1) < 2))
+    violations['flanker_23_25_balance'] = (((at_per_block == 23).sum(axis=-1) != (star_per_block == 23).sum(axis=-1)) |
+                                           ((at_per_block == 25).sum(axis=-1) != (star_per_block == 25).sum(axis=-1)))
+
+    # Letters go with '@' and numbers with '*' if letters_corr_at, the other way around otherwise
+    letters_matched = numpy.where(letters_corr_at[:, None], (at & alphabetic).sum(axis=-1),
+                                  (star & alphabetic).sum(axis=-1))
+    numbers_matched = numpy.where(letters_corr_at[:, None], (star & ~alphabetic).sum(axis=-1),
+                                  (at & ~alphabetic).sum(axis=-1))
+    expected_split = numpy.array([21] * 4 + [22] * 2)
+    violations['correlated_split'] = ((numpy.sort(letters_matched, axis=-1) != expected_split).any(axis=-1) |
+                                      (numpy.sort(numbers_matched, axis=-1) != expected_split).any(axis=-1))
+
+    # The type, right_key and helpful columns are saved as they are by the task, so they are checked against what
+    # was actually shown, over the practice block too
+    all_alphabetic = numpy.isin(columns['char'], list(schedule.LETTERS))
+    violations['type'] = ((columns['type'] == 'alphabetic') != all_alphabetic).any(axis=-1)
+
+    # Letters are answered with task_key1 in conditions 0 and 1, numbers with task_key2, and the other way around
+    # in conditions 2 and 3
+    letter_key = numpy.where(conditions // 2 == 0, 'j', 'f')[:, None]
+    number_key = numpy.where(conditions // 2 == 0, 'f', 'j')[:, None]
+    violations['right_key'] = (columns['right_key'] != numpy.where(all_alphabetic, letter_key, number_key)).any(axis=-1)
+
+    # '@' helps the type it's shown with most over the session, and hinders the other. '*' does the opposite
+    letters_at_helps = numpy.sign((at & alphabetic).sum(axis=(1, 2)) - (star & alphabetic).sum(axis=(1, 2)))
+    numbers_at_helps = numpy.sign((at & ~alphabetic).sum(axis=(1, 2)) - (star & ~alphabetic).sum(axis=(1, 2)))
+    at_helps = numpy.where(alphabetic, letters_at_helps[:, None, None], numbers_at_helps[:, None, None])
+    expected_helpful = numpy.select([at, star], [at_helps, -at_helps], 0)
+    violations['helpful'] = ((helpful != expected_helpful).any(axis=(1, 2)) |
+                             (columns['helpful'][:, :practice] != 0).any(axis=-1))
+
+    practice_alphabetic = numpy.isin(columns['char'][:, :practice], list(schedule.LETTERS))
+    violations['practice'] = ((practice_alphabetic.sum(axis=-1) != schedule.PRACTICE_TRIALS) |
+                              (columns['flanker'][:, :practice] != schedule.PRACTICE_FLANKER).any(axis=-1))
+
+    distributions = {
+        # How many blocks show '@' 23, 24 or 25 times
+        'at_per_block': numpy.bincount(at_per_block.ravel() - 23, minlength=3),
+        # How often each block position has the 22 split, for letters
+        'split_22_by_block': (letters_matched == 22).sum(axis=0),
+        # How often each character is shown, in the order of LETTERS then NUMBERS
+        'char_counts': char_counts.sum(axis=(0, 1)),
+        'helpful': numpy.bincount(helpful.ravel() + 1, minlength=3),
+    }
+    return {name: int(violated.sum()) for name, violated in violations.items()}, distributions
+
+
+def verify(sessions, seed=None, batch_size=10000, workers=None):
+    """ Check the constraints over the given number of sessions, spread evenly over the 4 conditions
+
+    @param int sessions:
+    @param int|None seed:
+    @param int batch_size: How many sessions each process generates at once
+    @param int|None workers: How many processes to use. Defaults to the number of CPUs
+    @return: Violations per constraint, and the distributions summed over all sessions
+    @rtype: (dict[str, int], dict[str, numpy.ndarray])
+    """
+    sizes = [batch_size] * (sessions // batch_size)
+    if sessions % batch_size != 0:
+        sizes.append(sessions % batch_size)
+    seeds = numpy.random.SeedSequence(seed).spawn(len(sizes))
+    firsts = numpy.cumsum([0] + sizes[:-1]) % 4
+
+    violations = {name: 0 for name in CONSTRAINTS}
+    distributions = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for batch_violations, batch_distributions in executor.map(check_batch, zip(sizes, seeds, firsts)):
+            for name in batch_violations:
+                violations[name] += batch_violations[name]
+            for name in batch_distributions:
+                distributions[name] = distributions.get(name, 0) + batch_distributions[name]
+
+    return violations, distributions
+
+
+def main():
+    """ Verify the schedules from the command line"""
+    parser = argparse.ArgumentParser(description="Check the counterbalancing of the task over many sessions.")
+    parser.add_argument('--sessions', type=int, default=100000, help="How many sessions to check (default: 100000)")
+    parser.add_argument('--seed', type=int, default=None, help="The seed to generate the sessions from")
+    parser.add_argument('--batch-size', type=int, default=10000, help="Sessions per batch (default: 10000)")
+    parser.add_argument('--workers', type=int, default=None, help="How many processes to use")
+    parser.add_argument('--json', help="Also write the report to this json file")
+    args = parser.parse_args()
+
+    start = time.time()
+    violations, distributions = verify(args.sessions, args.seed, args.batch_size, args.workers)
+    print("Checked {0} sessions in {1:.1f}s".format(args.sessions, time.time() - start))
+
+    for name, description in CONSTRAINTS.items():
+        print("{0:>6} violations: {1}".format(violations[name], description))
+
+    print("Blocks with '@' shown 23, 24, 25 times: {}".format(distributions['at_per_block'].tolist()))
+    print("Sessions with the 22 split in each block: {}".format(distributions['split_22_by_block'].tolist()))
+    print("Times each character was shown: {}".format(distributions['char_counts'].tolist()))
+    print("Trials with helpful -1, 0, 1: {}".format(distributions['helpful'].tolist()))
+
+    if args.json is not None:
+        with open(args.json, 'w') as report:
+            json.dump({'sessions': args.sessions, 'seed': args.seed, 'violations': violations,
+                       'distributions': {name: values.tolist() for name, values in distributions.items()}},
+                      report, indent=1)
+
+    if any(violations.values()):
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
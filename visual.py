@@ -1,30 +1,17 @@
 """ A package that focuses on the user interaction"""
 
+import bisect
+import os
 import sys
-from glob import glob
+from collections import OrderedDict
 
-import psychopy.tools.monitorunittools
-from psychopy import visual, event, gui, core
+from PIL import Image
+from psychopy import visual, event, core
 
-
-def ask_user_info(title):
-    """ A method used to ask the user for their participant id and their age group.
-        Will quit if the user presses 'cancel'
-
-        @param str title: The title of the pop-up box
-        @return (str, str): A tuple with of (participant id, age group)
-    """
-    info = {'Participant': '', 'Age group': ''}
-
-    # Store info about the experiment session
-    dialogue = gui.DlgFromDict(dictionary=info, title=title)
-
-    # User pressed cancel, so quit!
-    if dialogue.OK is False:
-        sys.exit()
-
-    # Return the results
-    return info['Participant'], info['Age group']
+import assets
+import inputs
+import units
+from timing import Choice, FrameIntervals, StimulusTiming, TypedText
 
 
 def pt_to_cm(pt):
@@ -35,266 +22,683 @@ def pt_to_cm(pt):
     return pt * 0.035277778
 
 
-class Window:
+class Window(assets.ImageSequence):
     """ A class used to interface the interaction with the user"""
 
-    def __init__(self, experiment):
-        """ Initializes the window class"""
+    def __init__(self, experiment, image_cache_size=64, responder=None):
+        """ Initializes the window class
+
+        @param experiment.Experiment experiment:
+        @param int image_cache_size: The maximum number of images to keep loaded at once
+        @param events.ReplayResponder|headless.SimulatedResponder|None responder: Who answers instead of the
+            participant, like a replayed session, or None to wait for the participant
+        """
         self.experiment = experiment
+        self.responder = responder
         # Create the window object we'll use
         self._window = visual.Window(fullscr=True, monitor="testMonitor", units="norm", color=1)
 
-        self._instruction_image = visual.ImageStim(win=self._window, units='norm', size=(2, 2))
+        # Images that were already loaded and scaled to the window, by their path. Least recently used first.
+        self._images = OrderedDict()
+        self._image_cache_size = image_cache_size
+
+        # All the images we can show
+        self.assets = assets.AssetManifest('images')
+        self.preload_images(self.assets.paths())
+
+        # Text stimuli that were already built, by their content and size
+        self._text_stimuli = {}
+
+        # Where key presses come from
+        self._keyboard = inputs.create_keyboard()
+
+        # Where clicks come from
+        self._mouse = inputs.create_mouse(self._window)
+
+        # What is on the screen right now: some text, or None for an image. Only the responder needs it
+        self._stimulus = None
+
+        # The stimuli drawn on the screen right now, to redraw them while holding them
+        self._screen = []
+
+        # The intervals between flips, to find dropped frames. Holds are counted in frames of the monitor's refresh
+        # rate, until warm_up measures the actual one
+        self.frame_intervals = FrameIntervals(self._window.monitorFramePeriod)
+        self._last_flip = core.getTime()
+
+        # When the last hold ends, if the screen is still held
+        self._hold_end = None
+
+        # Converts between norm, px and cm, worked out once from the window and the monitor
+        self.units = units.UnitConverter.from_window(self._window)
+
+        # Where things go on each kind of screen, by screen, in cm
+        self._layouts = {}
+
+        # Multiple choice screens that were already built, by their choices and font sizes
+        self._choice_screens = {}
 
     def norm_to_cm(self, point):
-        x = psychopy.tools.monitorunittools.pix2cm(point[0] * self._window.size[0] / 2.0, self._window.monitor)
-        y = psychopy.tools.monitorunittools.pix2cm(point[1] * self._window.size[1] / 2.0, self._window.monitor)
-        return x, y
+        return self.units.norm_to_cm(point)
 
     def px_to_cm(self, point):
-        x = psychopy.tools.monitorunittools.pix2cm(point[0], self._window.monitor)
-        y = psychopy.tools.monitorunittools.pix2cm(point[1], self._window.monitor)
-        return x, y
+        return self.units.px_to_cm(point)
 
     def px_to_norm(self, point):
-        x = 2.0 * point[0] / self._window.size[0]
-        y = 2.0 * point[1] / self._window.size[1]
-        return x, y
+        return self.units.px_to_norm(point)
 
     def scalar_norm_to_cm(self, scalar):
-        return self.norm_to_cm((scalar, 0))[0]
+        return self.units.scalar_norm_to_cm(scalar)
 
     def scalar_px_to_cm(self, scalar):
-        return self.px_to_cm((scalar, 0))[0]
+        return self.units.scalar_px_to_cm(scalar)
 
-    def show_image_sequence(self, genre, subgenre='', task=None, extension='.png'):
-        """ Shows all the images which follow the pattern
-        'image/{task}/{genre}/{subgenre}/*{extension}', in ascending order.
+    def _choice_layout(self, count):
+        """ Where everything goes on a screen with count choices, in cm. Worked out once per number of choices.
 
-        @param genre:
-        @param subgenre:
-        @param task:
-        @param extension:
-        @return:
+        @param int count:
+        @rtype: dict
+        """
+        key = ('choice', count)
+        if key not in self._layouts:
+            import numpy
+
+            # The buttons are spread evenly across the window, a quarter of the way up from the bottom
+            x_locs = 2 * (numpy.arange(1, count + 1) / (count + 1.0)) - 1
+            positions = self.norm_to_cm(numpy.column_stack([x_locs, numpy.full(count, -0.5)]))
+            self._layouts[key] = {'positions': [tuple(position) for position in positions.tolist()],
+                                  'button_max_width': self.scalar_norm_to_cm(2 / (count + 1.0)),
+                                  'wrap_width': self.scalar_norm_to_cm(2),
+                                  'instruction_x': self.scalar_norm_to_cm(-0.9)}
+        return self._layouts[key]
+
+    def _text_entry_layout(self):
+        """ Where everything goes on the screen for typing an answer, in cm. Worked out once.
+
+        @rtype: dict
+        """
+        key = ('text_entry',)
+        if key not in self._layouts:
+            self._layouts[key] = {'wrap_width': self.scalar_norm_to_cm(1.8),
+                                  'prompt_position': self.norm_to_cm((-.9, .9)),
+                                  'input_position': self.norm_to_cm((-.9, 0))}
+        return self._layouts[key]
+
+    def preload_images(self, paths):
+        """ Loads the images at the given paths and uploads them to the graphics card ahead of time,
+        so that show_image doesn't have to read them from the disk.
+
+        @param list[str] paths: The paths of the images that will be shown with show_image
+        @rtype: None
         """
-        if task is None:
-            task = self.experiment.section
-        image_paths = glob("images/{0}/{1}/{2}/*{3}".format(task, genre, subgenre, extension))
-        image_paths.sort()
+        for path in paths:
+            self._get_image(path)
+
+    def warm_up(self):
+        """ Gets everything ready before the first trial, so it doesn't pay for it: draws every prepared text and
+        loaded image once offscreen (building the font atlases and uploading the textures), primes the keyboard
+        and the mouse, and measures the refresh rate of the display, which holds are then counted in.
+
+        @return: How long each part took (in s), the measured refresh rate (in Hz) and any anomalies found
+        @rtype: dict
+        """
+        start = core.getTime()
+        anomalies = []
+
+        # Draw everything into the back buffer, and clear it before it's shown
+        stimuli = list(self._text_stimuli.values()) + list(self._images.values())
+        slowest_draw = 0.0
+        for stimulus in stimuli:
+            draw_start = core.getTime()
+            stimulus.draw()
+            slowest_draw = max(slowest_draw, core.getTime() - draw_start)
+        self._window.clearBuffer()
+        self._window.flip()
+        drawn = core.getTime()
 
-        for image_path in image_paths:
-            self.show_image(image_path)
-            self.wait_for_prompt()
+        if slowest_draw > self.frame_intervals.frame_duration:
+            anomalies.append("Drawing a stimulus took {0:.1f} ms, longer than a frame".format(slowest_draw * 1000))
+
+        # The first reads of the keyboard and the mouse are slower than the others
+        self._keyboard.clear()
+        self._keyboard.wait([], timeout=0)
+        self._mouse.clear()
+        self._mouse.wait(timeout=0)
+        event.getKeys()
+        primed = core.getTime()
+
+        refresh_rate = self._window.getActualFrameRate()
+        if refresh_rate is None:
+            refresh_rate = 1.0 / self._window.monitorFramePeriod
+            anomalies.append("The refresh rate could not be measured, using the monitor's {0:.1f} Hz"
+                             .format(refresh_rate))
+        elif abs(refresh_rate * self._window.monitorFramePeriod - 1) > 0.05:
+            anomalies.append("The measured refresh rate ({0:.1f} Hz) is not the monitor's ({1:.1f} Hz)"
+                             .format(refresh_rate, 1.0 / self._window.monitorFramePeriod))
+        self.frame_intervals.frame_duration = 1.0 / refresh_rate
+        measured = core.getTime()
+
+        return {'duration': measured - start,
+                'draw_duration': drawn - start,
+                'stimuli': len(stimuli),
+                'slowest_draw': slowest_draw,
+                'input_duration': primed - drawn,
+                'refresh_duration': measured - primed,
+                'refresh_rate': refresh_rate,
+                'anomalies': anomalies}
+
+    def _get_image(self, path):
+        """ Returns the stimulus for the image at path, scaled to fill the window.
+        Loads it if it isn't loaded already, forgetting the least recently used image if there are too many.
+
+        @rtype: visual.ImageStim
+        """
+        # The same image can be asked for with either '/' or '\\' separators
+        key = os.path.normpath(path.replace('\\', '/'))
+
+        if key in self._images:
+            self._images.move_to_end(key)
+            return self._images[key]
+
+        # Scale the image once, so it is drawn at the window's resolution as-is
+        size = (int(self._window.size[0]), int(self._window.size[1]))
+        image = Image.open(key).convert('RGBA').resize(size, Image.LANCZOS)
+
+        self._images[key] = visual.ImageStim(win=self._window, image=image, units='norm', size=(2, 2))
+        if len(self._images) > self._image_cache_size:
+            self._images.popitem(last=False)
+
+        return self._images[key]
 
     def show_image(self, path):
         """ Show the image at the given path.
 
         @param str path: the path of the image to be shown
+        @return: When the image was asked for and when it appeared on the screen
+        @rtype: StimulusTiming
+        """
+        request_time = core.getTime()
+
+        self._screen = [self._get_image(path)]
+        with self.experiment.profiler.span('window.draw'):
+            self._screen[0].draw()
+        drawn_time = core.getTime()
+        self._stimulus = None
+        self._hold_end = None
+
+        return StimulusTiming(request_time, drawn_time, self._flip())
+
+    def prepare_text(self, texts, font_size=24, legend=None, legend_font_size=24):
+        """ Builds the text stimuli for all the texts (and the legend) ahead of time,
+        so that show_text only has to draw them.
+
+        @param list[str] texts: The texts that will be shown with show_text
+        @param float font_size: The font size they will be shown with, in pt
+        @param str|None legend: The legend that will be shown beneath them
+        @param float legend_font_size: The font size of the legend, in pt
         @rtype: None
         """
-        self._instruction_image.image = path
-        self._instruction_image.draw()
-        self._window.flip()
+        for text in texts:
+            self._get_text_stimulus(text, font_size)
+
+        if legend is not None:
+            self._get_legend_stimulus(legend, legend_font_size)
+
+    def _get_text_stimulus(self, text, font_size):
+        """ Returns the stimulus for text at font_size pt, building it if it wasn't built before
+
+        @rtype: visual.TextStim
+        """
+        key = ('text', text, font_size)
+        if key not in self._text_stimuli:
+            # convert size to cm
+            font_size_cm = pt_to_cm(font_size)
+            self._text_stimuli[key] = visual.TextStim(self._window, text=text, wrapWidth=None, color=-1,
+                                                      font='Times New Roman', units='cm', height=font_size_cm)
+        return self._text_stimuli[key]
+
+    def _get_legend_stimulus(self, legend, font_size):
+        """ Returns the stimulus for a legend at font_size pt, building it if it wasn't built before
+
+        @rtype: visual.TextStim
+        """
+        key = ('legend', legend, font_size)
+        if key not in self._text_stimuli:
+            # convert size to cm
+            font_size_cm = pt_to_cm(font_size)
+            self._text_stimuli[key] = visual.TextStim(self._window, text=legend, wrapWidth=None, color=-1,
+                                                      font='Times New Roman', units='cm', height=font_size_cm,
+                                                      alignVert='bottom', pos=self.norm_to_cm((0, -1)))
+        return self._text_stimuli[key]
 
     def show_text(self, text, font_size=24, legend=None, legend_font_size=24):
-        """ Shows the text text on the main screen. font size in pt. Optionally shows a legend beneath the text"""
-        # convert size to cm
-        font_size_cm = pt_to_cm(font_size)
-        text_element = visual.TextStim(self._window, text=text, wrapWidth=None, color=-1,
-                                       font='Times New Roman', units='cm', height=font_size_cm)
-        text_element.draw()
+        """ Shows the text text on the main screen. font size in pt. Optionally shows a legend beneath the text.
+        Returns when the text was asked for, drawn, and when it appeared on the screen.
 
-        if legend is not None:
-            legend_font_size_cm = pt_to_cm(legend_font_size)
-            text_element = visual.TextStim(self._window, text=legend, wrapWidth=None, color=-1, font='Times New Roman',
-                                           units='cm', height=legend_font_size_cm, alignVert='bottom',
-                                           pos=self.norm_to_cm((0, -1)))
-            text_element.draw()
-        self._window.flip()
+        Texts prepared with prepare_text are only drawn, others are built the first time they are shown.
 
-    def wait_for_choice(self, prompt, choices, prompt_font_size=24, instruction_font_size=20, choice_font_size=20):
-        """ Displays the given choices in lst choices with the given str prompt,
-            and waits until one is picked. """
-        # Calculate font sizes in cm
-        prompt_font_size = pt_to_cm(prompt_font_size)
-        instruction_font_size = pt_to_cm(instruction_font_size)
-        choice_font_size = pt_to_cm(choice_font_size)
+        @rtype: StimulusTiming
+        """
+        request_time = core.getTime()
 
-        # Calculate maximum size of each button
-        button_max_width = self.scalar_norm_to_cm(2 / (len(choices) + 1.0))
-        buttons = []
+        self._screen = [self._get_text_stimulus(text, font_size)]
+        if legend is not None:
+            self._screen.append(self._get_legend_stimulus(legend, legend_font_size))
 
-        # Keep track of the maximum text height
-        max_button_height = 0
+        with self.experiment.profiler.span('window.draw'):
+            for stimulus in self._screen:
+                stimulus.draw()
+        drawn_time = core.getTime()
+        self._stimulus = text
+        self._hold_end = None
 
-        for i in range(len(choices)):
-            # Figure out where to place the button using norm units
-            x_loc = 2 * ((i + 1.0) / (len(choices) + 1)) - 1
-            y_loc = -0.5
+        return StimulusTiming(request_time, drawn_time, self._flip())
 
-            # Convert to cm
-            x_loc, y_loc = self.norm_to_cm((x_loc, y_loc))
+    def _flip(self):
+        """ Flips the window, and returns the time the flip actually happened at (in core.getTime() seconds)
 
-            # Create and draw the text to display on the button
-            text = visual.TextStim(self._window, text=choices[i], wrapWidth=button_max_width - 1,
-                                   color=-1, font='Times New Roman', units='cm',
-                                   pos=(x_loc, y_loc), height=choice_font_size)
-            text.draw()
+        @rtype: float
+        """
+        flip_time = []
+        self._window.callOnFlip(lambda: flip_time.append(core.getTime()))
+        with self.experiment.profiler.span('window.flip'):
+            self._window.flip()
+        self._last_flip = flip_time[0]
+        self.frame_intervals.flip(self._last_flip)
+        return self._last_flip
+
+    def _pause(self):
+        """ The window stops being flipped every frame, like while waiting for a response"""
+        self.frame_intervals.pause()
+        self._hold_end = None
+
+    def hold(self, frames, wait_for_end=False):
+        """ Keep what is on the screen for the given number of frames, counted from the last flip. The screen is
+        redrawn and flipped every frame, so every frame interval is recorded and dropped frames can be found.
+
+        Returns right before the refresh at the end of the hold, so that the next flip lands on it, or the next
+        hold continues from it. If nothing is shown after the hold, wait_for_end waits for that refresh too.
+        The end of the hold is fixed when it starts, so dropped frames don't push back everything that comes after
+        them. If the end can't be met anyway, the hold is recorded as an overrun.
+
+        @param int frames:
+        @param bool wait_for_end:
+        @return: How late the hold ended, in s (0 if it was on time)
+        @rtype: float
+        """
+        if frames <= 0:
+            return 0.0
+
+        # Holds in a row add up, instead of each starting a frame early
+        frame_duration = self.frame_intervals.frame_duration
+        start = self._hold_end if self._hold_end is not None else self._last_flip
+        end = self._hold_end = start + frames * frame_duration
+        last_flip = self._last_flip
+        while last_flip + 1.5 * frame_duration < end:
+            for stimulus in self._screen:
+                stimulus.draw()
+            last_flip = self._flip()
+
+        overrun = max(last_flip + frame_duration, core.getTime()) - end
+        if overrun < frame_duration / 2:
+            overrun = 0.0
+        else:
+            self.frame_intervals.overran(overrun)
+
+        if wait_for_end:
+            core.wait(max(0, end - core.getTime()), hogCPUperiod=0)
+        return overrun
+
+    def _respond(self, answer):
+        """ Takes an answer from the responder, waiting for as long as it took if the responder is realtime
+
+        @param (object, float) answer: The answer and how long it took, in s
+        @return: The answer
+        """
+        answer, delay = answer
+        if self.responder.realtime:
+            core.wait(delay)
+        return answer
 
-            # Find the dimensions of the text's bounding box in cm
-            text_width, text_height = self.px_to_cm(text.boundingBox)
+    def _get_choice_screen(self, choices, prompt_font_size, instruction_font_size, choice_font_size):
+        """ Returns the screen for choices with the given font sizes (in pt), building it if it wasn't built before
 
-            # Calculate the size of the button we'll draw
-            button_width = min(1 + text_width, button_max_width)
-            button_height = 1 + text_height
+        @rtype: ChoiceScreen
+        """
+        key = (tuple(choices), prompt_font_size, instruction_font_size, choice_font_size)
+        if key not in self._choice_screens:
+            self._choice_screens[key] = ChoiceScreen(self, choices, prompt_font_size, instruction_font_size,
+                                                     choice_font_size)
+        return self._choice_screens[key]
 
-            # Keep track of the maximum button height
-            max_button_height = max(button_height, max_button_height)
+    def prepare_choice(self, prompt, choices, prompt_font_size=24, instruction_font_size=20, choice_font_size=20):
+        """ Builds the screen for a question that will be asked with wait_for_choice ahead of time, and draws it
+        once offscreen, so showing it only has to draw it.
 
-            # Create and draw the box that will represent this button
-            rect = visual.Rect(self._window, button_width, button_height, lineColor=-1,
-                               pos=(x_loc, y_loc), units='cm')
-            rect.draw()
+        @rtype: None
+        """
+        screen = self._get_choice_screen(choices, prompt_font_size, instruction_font_size, choice_font_size)
+        screen.show_prompt(prompt)
+        screen.draw()
+        self._window.clearBuffer()
 
-            # Add the rectangle to the set of rectangles to check for input
-            buttons += [rect]
+    def wait_for_choice(self, prompt, choices, prompt_font_size=24, instruction_font_size=20, choice_font_size=20,
+                        timestamped=False):
+        """ Displays the given choices in lst choices with the given str prompt,
+            and waits until one is picked.
 
-        # Create and display the prompt
-        text = visual.TextStim(self._window, text=prompt, wrapWidth=self.scalar_norm_to_cm(2), color=-1,
-                               font='Times New Roman', units='cm', height=prompt_font_size)
-        text.draw()
+            If timestamped is True, a timing.Choice with when the choices appeared and when one was clicked
+            is returned instead of just the choice.
 
-        # Get the height of the prompt text
-        x_loc = self.scalar_norm_to_cm(-0.9)
-        y_loc = (instruction_font_size + prompt_font_size) / 2
+            @rtype: str|timing.Choice
+        """
+        self._pause()
 
-        # Tell the user to use their mouse
-        text = visual.TextStim(self._window, text="Use your mouse to click:", wrapWidth=self.scalar_norm_to_cm(2),
-                               color=-1, font='Times New Roman', alignHoriz='left',
-                               pos=(x_loc, y_loc),
-                               units='cm', height=instruction_font_size)
-        text.draw()
+        # Only the prompt changes between questions with the same choices
+        screen = self._get_choice_screen(choices, prompt_font_size, instruction_font_size, choice_font_size)
+        screen.show_prompt(prompt)
+        screen.draw()
+        onset = self._flip()
+        self._pause()
 
-        self._window.flip()
+        # The responder answers instead of the mouse, but the choices are still shown
+        if self.responder is not None:
+            choice = Choice(self._respond(self.responder.choose(prompt, choices)), onset, core.getTime())
+            return choice if timestamped else choice.name
 
-        mouse = event.Mouse(win=self._window)
-        # Wait for the user to click on one of them
-        while True:
-            for i in range(len(buttons)):
-                if mouse.isPressedIn(buttons[i], buttons=[0]):
-                    return choices[i]
+        # Only clicks made once the choices are shown count
+        self._mouse.clear()
+        self._keyboard.clear()
 
-            if len(event.getKeys(keyList=["escape"])) != 0:
+        # Wait for the user to click on one of them, checking for escape in between
+        while True:
+            click = self._mouse.wait(timeout=0.05)
+            if click is not None:
+                i = screen.hit_test(self.px_to_cm((click.x, click.y)))
+                if i is not None:
+                    choice = Choice(choices[i], onset, click.time)
+                    return choice if timestamped else choice.name
+
+            if self._keyboard.wait(["escape"], timeout=0) is not None:
                 self.experiment.save_data()
                 sys.exit()
 
-            core.wait(0.01, hogCPUperiod=0)
-
-    def wait_for_prompt(self, timer=None, keys='space'):
+    def wait_for_prompt(self, timer=None, keys='space', timestamped=False):
         """ Waits indefinitely until a key in keys is pressed. Return the key that was pressed.
 
             If a timer is provided, will wait for prompt until the timer runs out. If the timer runs out,
             None will be returned.
 
-            @rtype: str|None
+            If timestamped is True, a timing.KeyPress with the key and the time it was pressed
+            is returned instead of just the key.
+
+            @rtype: str|timing.KeyPress|None
         """
-        # Clear the key's buffer:
-        event.clearEvents()
+        self._pause()
 
         if isinstance(keys, str):
             keys = [keys]
 
+        if self.responder is not None:
+            key = self._respond(self.responder.press_key(self._stimulus, keys, self.experiment.config))
+            key_press = None if key is None else inputs.KeyPress(key, core.getTime())
+            return key_press if timestamped or key_press is None else key_press.name
+
+        # Clear the key's buffer:
+        self._keyboard.clear()
+
         keys = [k.lower() for k in keys] + [k.upper() for k in keys]
 
         # Wait for input
-        while timer is None or timer.getTime() >= 0:
-            # Get the keys that were pressed that we are watching
-            keys_pressed = event.getKeys(keyList=keys)
-            if len(keys_pressed) != 0:
-                return keys_pressed[0]
+        timeout = None if timer is None else max(0, timer.getTime())
+        key_press = self._keyboard.wait(keys + ["escape"], timeout)
 
-            if len(event.getKeys(keyList=["escape"])) != 0:
-                self.experiment.save_data()
-                sys.exit()
+        if key_press is None:
+            return None
 
-        return None
+        if key_press.name == "escape":
+            self.experiment.save_data()
+            sys.exit()
+
+        return key_press if timestamped else key_press.name
+
+    def get_time(self):
+        """ The current time, in core.getTime() seconds
+
+        @rtype: float
+        """
+        return core.getTime()
 
     def close(self):
         """ Closes this window"""
+        self._keyboard.close()
+        self._mouse.close()
         self._window.close()
 
-    def get_input_text(self, prompt=None, prompt_font_size=24, input_font_size=20):
-        """ Gets user input as text. The prompt
+    def get_input_text(self, prompt=None, prompt_font_size=24, input_font_size=20, timestamped=False):
+        """ Gets user input as text. The screen is only redrawn when the text changes.
+
+        If timestamped is True, a timing.TypedText with when the screen appeared and every keystroke typed on it
+        is returned instead of just the text.
 
         @return: The text the user inputted until they pressed the key '0'
-        @rtype: str
+        @rtype: str|timing.TypedText
         """
-        # Calculate font sizes in cm
-        prompt_font_size = pt_to_cm(prompt_font_size)
-        input_font_size = pt_to_cm(input_font_size)
+        self._pause()
+        screen = TextEntryScreen(self, prompt, prompt_font_size, input_font_size)
+
+        # The responder types instead of the keyboard, but the screen and the answer are still shown
+        if self.responder is not None:
+            screen.draw()
+            onset = self._flip()
+            self._pause()
+            text = self._respond(self.responder.type_text(prompt))
+            typed = TypedText.evenly(text, onset, core.getTime(), TextEntryScreen.SUBMIT_KEY)
+            screen.text = text
+            screen.dirty = True
+            screen.draw()
+            self._window.flip()
+            return typed if timestamped else typed.text
+
+        text_input = inputs.create_text_input(self._window)
+        try:
+            screen.draw()
+            onset = self._flip()
+            self._pause()
+
+            # Only keystrokes typed once the screen is shown count
+            text_input.clear()
+
+            submitted = False
+            while not submitted:
+                # Handle everything typed since the last redraw, in the order it was typed
+                for keystroke in text_input.wait():
+                    if keystroke.key == 'escape':
+                        # escape means we exit the experiment
+                        self.experiment.save_data()
+                        core.quit()
+
+                    submitted = screen.type(keystroke)
+                    if submitted:
+                        break
+
+                # Draw what the user wrote, if it changed
+                if screen.dirty and not submitted:
+                    screen.draw()
+                    self._window.flip()
+        finally:
+            text_input.close()
+
+        typed = TypedText(screen.text, onset, screen.keystrokes)
+        return typed if timestamped else typed.text
+
+
+class TextEntryScreen:
+    """ A screen to type an answer on: a prompt, and the text typed so far beneath it. Keeps every keystroke typed,
+    and whether the text changed since it was last drawn, so it's only rebuilt and redrawn when it changes.
+    """
 
-        # Clear the keys buffer
-        event.getKeys()
+    # The key that submits the text
+    SUBMIT_KEY = '0'
 
+    def __init__(self, window, prompt, prompt_font_size, input_font_size):
+        """ Builds the screen
+
+        @param Window window:
+        @param str|None prompt:
+        @param float prompt_font_size: In pt
+        @param float input_font_size: In pt
+        """
         # Set up the prompt's textbox's text
         prompt = "" if prompt is None or prompt == "" else prompt + ". "
-        text = prompt + "Please type in your answer, press the key '0' to submit it:"
+        text = prompt + "Please type in your answer, press the key '{}' to submit it:".format(self.SUBMIT_KEY)
 
         # Make the prompt textbox
-        text_instr = visual.TextStim(win=self._window, text=text, color=-1, wrapWidth=self.scalar_norm_to_cm(1.8),
-                                     alignHoriz='left', alignVert='top', units='cm',
-                                     pos=self.norm_to_cm((-.9, .9)), height=prompt_font_size)
+        layout = window._text_entry_layout()
+        self.instructions = visual.TextStim(win=window._window, text=text, color=-1, wrapWidth=layout['wrap_width'],
+                                            alignHoriz='left', alignVert='top', units='cm',
+                                            pos=layout['prompt_position'], height=pt_to_cm(prompt_font_size))
 
         # Set up a textbox for user input
-        input_text = ""
-
-        input_box = visual.TextStim(win=self._window, text=input_text, color=-1, units='cm', height=input_font_size,
-                                    wrapWidth=self.scalar_norm_to_cm(1.8), alignHoriz='left', alignVert='top',
-                                    pos=self.norm_to_cm((-.9, 0)))
-        input_box.draw()
-
-        # Get user input
-        inputting = True
-
-        while inputting:
-            # Get the keys that were pressed
-            keys = event.getKeys()
-
-            # Handle each key. Some key presses have special meaning
-            for key in keys:
-                if key == '0':
-                    # 0 means we submit the captured text
-                    inputting = False
-                    break
-                elif key == 'escape':
-                    # escape means we exit the experiment
-                    self.experiment.save_data()
-                    core.quit()
-                elif key == 'space':
-                    # space means we add a blank
-                    input_text += ' '
-                elif key == 'backspace':
-                    # backspace means we delete a char
-                    if len(input_text) > 0:
-                        input_text = input_text[:-1]
-                elif key == 'return':
-                    # return means we add a newline
-                    input_text += '\n'
-                elif key == 'comma':
-                    input_text += ','
-                elif key == 'period':
-                    input_text += '.'
-                elif len(key) == 1 and key.isalnum():
-                    # Regular character to be inputted
-                    input_text += key
-
-            # Draw what the user wrote and the instructions to the screen
-            input_box.text = input_text
-            input_box.draw()
-            text_instr.draw()
-            self._window.flip()
+        self.input_box = visual.TextStim(win=window._window, text="", color=-1, units='cm',
+                                         height=pt_to_cm(input_font_size), wrapWidth=layout['wrap_width'],
+                                         alignHoriz='left', alignVert='top', pos=layout['input_position'])
+
+        self.text = ""
+        self.keystrokes = []
+        self.dirty = False
+
+    def type(self, keystroke):
+        """ Add a keystroke to the text
+
+        @param timing.Keystroke keystroke:
+        @return: Whether the keystroke submits the text
+        @rtype: bool
+        """
+        self.keystrokes.append(keystroke)
+        if keystroke.text == self.SUBMIT_KEY:
+            return True
+
+        if keystroke.key == 'backspace':
+            # backspace means we delete a char
+            if len(self.text) > 0:
+                self.text = self.text[:-1]
+                self.dirty = True
+        elif keystroke.text != '':
+            self.text += keystroke.text
+            self.dirty = True
+        return False
+
+    def draw(self):
+        """ Draw the screen, rebuilding the text typed if it changed"""
+        if self.dirty:
+            self.input_box.text = self.text
+            self.dirty = False
+        self.input_box.draw()
+        self.instructions.draw()
+
+
+class ChoiceScreen:
+    """ A multiple choice screen: a prompt, a line telling the participant to use the mouse, and a button per choice.
+    The buttons and the instruction are built and measured once. Each prompt is built the first time it's shown,
+    so moving to the next question with the same choices only has to draw.
+    """
 
-            # Only check evey 100 ms
-            core.wait(0.1, 0)
+    def __init__(self, window, choices, prompt_font_size, instruction_font_size, choice_font_size):
+        """ Builds the screen
+
+        @param Window window:
+        @param list[str] choices:
+        @param float prompt_font_size: In pt
+        @param float instruction_font_size: In pt
+        @param float choice_font_size: In pt
+        """
+        self._window = window._window
+
+        # Calculate font sizes in cm
+        self.prompt_font_size = pt_to_cm(prompt_font_size)
+        instruction_font_size = pt_to_cm(instruction_font_size)
+        choice_font_size = pt_to_cm(choice_font_size)
+
+        # Calculate maximum size of each button
+        layout = window._choice_layout(len(choices))
+        button_max_width = layout['button_max_width']
+        self.wrap_width = layout['wrap_width']
+
+        self.labels = []
+        self.buttons = []
+
+        # The bounds (left, right, bottom, top) of each button in cm, from left to right, to find the clicked one
+        self._bounds = []
+        for i in range(len(choices)):
+            # Where to place the button, in cm
+            x_loc, y_loc = layout['positions'][i]
+
+            # Create the text to display on the button
+            text = visual.TextStim(self._window, text=choices[i], wrapWidth=button_max_width - 1,
+                                   color=-1, font='Times New Roman', units='cm',
+                                   pos=(x_loc, y_loc), height=choice_font_size)
+            self.labels.append(text)
+
+            # Find the dimensions of the text's bounding box in cm
+            text_width, text_height = window.px_to_cm(text.boundingBox)
+
+            # Calculate the size of the button we'll draw
+            button_width = min(1 + text_width, button_max_width)
+            button_height = 1 + text_height
+
+            # Create the box that will represent this button. The participant clicks in these
+            self.buttons.append(visual.Rect(self._window, button_width, button_height, lineColor=-1,
+                                            pos=(x_loc, y_loc), units='cm'))
+            self._bounds.append((x_loc - button_width / 2, x_loc + button_width / 2,
+                                 y_loc - button_height / 2, y_loc + button_height / 2, i))
+
+        self._bounds.sort()
+        self._lefts = [bounds[0] for bounds in self._bounds]
+
+        # Tell the user to use their mouse, just above the prompt
+        self.instruction = visual.TextStim(self._window, text="Use your mouse to click:", wrapWidth=self.wrap_width,
+                                           color=-1, font='Times New Roman', alignHoriz='left',
+                                           pos=(layout['instruction_x'],
+                                                (instruction_font_size + self.prompt_font_size) / 2),
+                                           units='cm', height=instruction_font_size)
+
+        # The prompts built so far, by their text, and the one shown now
+        self._prompts = {}
+        self.prompt = None
+
+    def show_prompt(self, prompt):
+        """ Show prompt the next time the screen is drawn, building it if it wasn't built before
+
+        @param str prompt:
+        @rtype: None
+        """
+        if prompt not in self._prompts:
+            self._prompts[prompt] = visual.TextStim(self._window, text=prompt, wrapWidth=self.wrap_width, color=-1,
+                                                    font='Times New Roman', units='cm', height=self.prompt_font_size)
+        self.prompt = self._prompts[prompt]
+
+    def hit_test(self, point):
+        """ The index of the button at point, or None if there is no button there
+
+        @param (float, float) point: In cm from the center of the window
+        @rtype: int|None
+        """
+        x, y = point
+        # The buttons don't overlap, so the only candidate is the last one starting left of x
+        candidate = bisect.bisect_right(self._lefts, x) - 1
+        if candidate < 0:
+            return None
+
+        left, right, bottom, top, i = self._bounds[candidate]
+        if x <= right and bottom <= y <= top:
+            return i
+        return None
 
-        return input_text
+    def draw(self):
+        """ Draw the screen"""
+        for label, button in zip(self.labels, self.buttons):
+            label.draw()
+            button.draw()
+        self.prompt.draw()
+        self.instruction.draw()